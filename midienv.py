@@ -1,27 +1,119 @@
 from pyo import *
 from itertools import *
+from tablecache import *
 from triggers import *
 
+# table classes interpolating linearly between their points' values, whose envelopes splitSustain splits exactly
+SPLITTABLE = (LinTable, CosTable)
+
+def envSegments(table):
+    """Return the breakpoints of the envelope 'table' as a tuple of (index, value) tuples,
+    with the table class and size, as a (class, size, points) tuple. 
+    The table must have a getPoints method(e.g. LinTable, CosTable)."""
+    return (type(table), table.getSize(), tuple(tuple(p) for p in table.getPoints()))
+
+def splitSustain(segments, index=-1):
+    """Split the envelope given by 'segments'(see envSegments) on its point 'index'(the sustain point),
+    such that envelope = shape + level*unit, where shape is the envelope with the sustain point at 0,
+    unit the envelope with all points at 0 but the sustain point at 1, and level the value of the sustain point.
+    Return the shape and unit tables(shared, see cachedTable) and the level.
+    The table class must be one of SPLITTABLE, for which this is exact."""
+    cls, size, points = segments
+    if cls not in SPLITTABLE:
+        raise Exception("Can not split a %s on its sustain point, must be one of %s"%(
+            cls.__name__, ", ".join(c.__name__ for c in SPLITTABLE)))
+    index = index % len(points)
+    shape = [(x, 0 if i == index else y) for i, (x, y) in enumerate(points)]
+    unit = [(x, 1 if i == index else 0) for i, (x, y) in enumerate(points)]
+    return cachedTable(cls, shape, size), cachedTable(cls, unit, size), points[index][1]
+
+def _splitTable(segments, table):
+    """Split 'table' if its class allows it, otherwise keep it whole with a silent unit table."""
+    cls, size, points = segments
+    if cls in SPLITTABLE:
+        return splitSustain(segments)
+    return table, cachedTable(LinTable, [(0, 0), (size - 1, 0)], size), points[-1][1]
+
+def _splitTables(adtable):
+    """Return the segments, shape and unit tables of 'adtable'(a table or a list of tables),
+    and the sustain level(a list for a list of tables)."""
+    tables = adtable if isinstance(adtable, list) else [adtable]
+    segments = [envSegments(table) for table in tables]
+    shapes, units, levels = zip(*[_splitTable(segment, table) for segment, table in zip(segments, tables)])
+    return segments, list(shapes), list(units), list(levels) if isinstance(adtable, list) else levels[0]
+
 class MidiEnv(PyoObject):
-    def __init__(self, input, adtable, reltable, addur=.5, reldur=.5, mul=1, add=0):
+    """
+    Midi envelope, with an attack/decay phase read from `adtable` on note on(rising input),
+    held at the sustain level(last point of `adtable`) until note off(input going back to 0),
+    then a release phase read from `reltable`. The amplitude is the input value at note on.
+
+    The attack/decay table is precomputed into two shared tables, the envelope without its sustain point
+    and the contribution of the sustain point, so the sustain level and the durations
+    are single values, changed without reading or rebuilding any table.
+    This is only exact for LinTable and CosTable(see SPLITTABLE). Other tables(e.g. ExpTable, CurveTable)
+    are played as they are, the sustain level then applying from the sustain phase on.
+
+    :Parent: :py:class:`PyoObject`
+
+    :Args:
+
+        input : PyoObject
+            Note velocity, greater than 0 while the note is held.
+        adtable : PyoTableObject
+            Attack/decay envelope, its last point being the sustain level. Must have a getPoints method.
+        reltable : PyoTableObject
+            Release envelope, scaled by the level at note off.
+        addur : float or PyoObject, optional
+            Duration of the attack/decay phase, in seconds. Defaults to 0.5.
+        reldur : float or PyoObject, optional
+            Duration of the release phase, in seconds. Defaults to 0.5.
+        sustain : float or PyoObject, optional
+            Sustain level, replacing the last point of `adtable`. Defaults to None(the value of that point).
+
+    """
+    def __init__(self, input, adtable, reltable, addur=.5, reldur=.5, sustain=None, mul=1, add=0):
         PyoObject.__init__(self, mul, add)
         self._input = input
-        self._adtable = adtable
         self._reltable = reltable
         self._addur = addur
         self._reldur = reldur
         self._in_fader = InputFader(input)
         self._trigon = Thresh(self._in_fader, threshold=0.0, dir=0)
         self._trigoff = Select(self._in_fader, value=0)
-        adtable, reltable, lmax = convertArgsToLists(adtable, reltable)
-        self._sustain = Sig([wrap(adtable, i).getPoints()[-1][1] for i in range(lmax)])
-        self._adenv = TrigEnv(self._trigon, adtable, dur=addur)
-        self._susenv = TrigMap((self._adenv["trig"], self._trigoff), values=(self._sustain, 0), init=0)
-        self._relenv = TrigEnv(self._trigoff, reltable, dur=reldur, mul=SampHold(self._adenv+self._susenv, self._trigoff, value=1))
-        self._phase = TrigMap((self._trigon, TrigGate(self._adenv["trig"], self._trigon, self._trigoff), self._trigoff), values=(0, 1, 2), init=0)
-        self._mix = Selector([self._adenv, self._susenv, self._relenv], voice=self._phase, mul=Sig(self._in_fader, mul=self._mul))
+        self._adtable = adtable
+        self._segments, shapes, units, levels = _splitTables(adtable)
+        self._sustainvalue = levels if sustain is None else sustain
+        self._sustain = Sig(self._sustainvalue)
+        self._adshape = TrigEnv(self._trigon, shapes, dur=addur)
+        self._adsus = TrigEnv(self._trigon, units, dur=addur, mul=self._sustain)
+        self._adenv = self._adshape+self._adsus
+        # the sustain level is only reset at the next note on, so the release starts from it
+        self._susenv = TrigMap((self._adshape["trig"], self._trigon), values=(self._sustain, 0), init=0)
+        self._level = self._adenv+self._susenv
+        self._rellevel = SampHold(self._level, self._trigoff, value=1)
+        self._relenv = TrigEnv(self._trigoff, reltable, dur=reldur, mul=self._rellevel)
+        self._sustaining = TrigGate(self._adshape["trig"], self._trigon, self._trigoff)
+        self._phase = TrigMap((self._trigon, self._sustaining, self._trigoff), values=(0, 1, 2), init=0)
+        # velocity of the note, held through the release
+        self._velocity = SampHold(self._in_fader, self._trigon, value=1)
+        self._amp = Sig(self._velocity, mul=self._mul)
+        self._mix = Selector([self._adenv, self._susenv, self._relenv], voice=self._phase, mul=self._amp)
+        self._internals = [self._in_fader, self._trigon, self._trigoff, self._sustain, self._adshape, self._adsus,
+                           self._adenv, self._susenv, self._level, self._rellevel, self._relenv, self._sustaining,
+                           self._phase, self._velocity, self._amp]
         self._base_objs = self._mix.getBaseObjects()
 
+    def play(self, dur=0, delay=0):
+        for obj in self._internals:
+            obj.play(dur, delay)
+        return PyoObject.play(self, dur, delay)
+
+    def stop(self):
+        for obj in self._internals:
+            obj.stop()
+        return PyoObject.stop(self)
+
     def out(self, chnl=0, inc=1, dur=0, delay=0):
         return self.play(dur, delay)
 
@@ -49,13 +141,14 @@ class MidiEnv(PyoObject):
 
         :Args:
 
-            x : float
+            x : float or PyoObject
                 new `addur` attribute.
 
         """
-        pyoArgsAssert(self, "n", x)
+        pyoArgsAssert(self, "O", x)
         self._addur = x
-        self._adenv.dur = x
+        self._adshape.dur = x
+        self._adsus.dur = x
 
     def setReleaseDur(self, x):
         """
@@ -65,47 +158,56 @@ class MidiEnv(PyoObject):
 
         :Args:
 
-            x : float
+            x : float or PyoObject
                 new `reldur` attribute.
 
         """
-        pyoArgsAssert(self, "n", x)
+        pyoArgsAssert(self, "O", x)
         self._reldur = x
         self._relenv.dur = x
 
     def setADTable(self, x):
         """
-        Replace the `table` attribute,
-        which controls the table which describes
-        the form of the envelope.
+        Replace the `adtable` attribute,
+        which describes the form of the attack/decay phase,
+        its last point giving the sustain level.
 
         :Args:
 
             x : PyoTableObject
-                new `table` attribute. 
+                new `adtable` attribute. Must have a getPoints method.
 
         """
         self._adtable = x
-        self._adenv.table = x
+        self._segments, shapes, units, levels = _splitTables(x)
+        self._adshape.table = shapes
+        self._adsus.table = units
+        self.setSustain(levels)
+
+
+    def getSegments(self):
+        """Return the precomputed attack/decay envelope of each stream, as (class, size, points) tuples(see envSegments)."""
+        return list(self._segments)
 
     def setSustain(self, x):
         """
         Replace the `sustain` attribute,
-        changing the value of the point given by the `sustainpoint`
-        attribute.
+        the level of the sustain phase, at the end of the attack/decay phase.
+        Running envelopes follow it immediately.
 
         :Args:
 
-            x : float
+            x : float or PyoObject
                 value of the new sustain
 
         """
-        self._adtable.list[-1][1] = x
+        self._sustainvalue = x
+        self._sustain.value = x
         
     @property
     def sustain(self):
-        """float. Amplitude of the sustain phase, as fraction of the peak amplitude."""
-        return self._sustain
+        """float or PyoObject. Amplitude of the sustain phase, as fraction of the peak amplitude."""
+        return self._sustainvalue
     
     @sustain.setter
     def sustain(self, x): self.setSustain(x)
@@ -125,3 +227,268 @@ class MidiEnv(PyoObject):
     @reldur.setter
     def reldur(self, x):
         self.setReleaseDur(x)
+
+class PolyMidiEnv(PyoObject):
+    """
+    Polyphonic MidiEnv, with a fixed pool of preallocated voices.
+
+    Notes are started and released with `noteon` and `noteoff`, which assign them
+    to the voices of the pool. A voice is stopped(costing no CPU) from the end
+    of its release until its next note. When no voice is free, one is stolen
+    according to `policy`.
+
+    :Parent: :py:class:`PyoObject`
+
+    :Args:
+
+        adtable : PyoTableObject
+            Attack/decay envelope, its last point being the sustain level.
+        reltable : PyoTableObject
+            Release envelope.
+        voices : int, optional
+            Number of voices. Defaults to 8.
+        addur : float, optional
+            Duration of the attack/decay phase, in seconds. Defaults to 0.5.
+        reldur : float, optional
+            Duration of the release phase, in seconds. Defaults to 0.5.
+        sustain : float, optional
+            Sustain level. Defaults to None(the last point of `adtable`).
+        policy : string, optional
+            Voice allocation when all voices are busy:
+                "roundrobin": voices are used in turn,
+                "oldest": steal the voice with the oldest note,
+                "quietest": steal the voice with the lowest envelope level.
+            Releasing voices are stolen before held ones with "oldest" and "quietest".
+            Defaults to "oldest".
+        function : callable, optional
+            Called with the index of a voice and True when it starts after being free,
+            False when it is stopped. Used to start and stop objects following the voice.
+            Defaults to None.
+
+    .. note::
+
+        The output has one stream per voice. `pitch` holds the pitch given
+        to `noteon` for each voice.
+
+    """
+    def __init__(self, adtable, reltable, voices=8, addur=.5, reldur=.5, sustain=None, policy="oldest",
+                 function=None, mul=1, add=0):
+        PyoObject.__init__(self, mul, add)
+        self._function = function
+        self._adtable = adtable
+        self._reltable = reltable
+        self._addur = addur
+        self._reldur = reldur
+        self._sustainvalue = _splitTables(adtable)[3] if sustain is None else sustain
+        self.setPolicy(policy)
+        self._velocities = [Sig(0) for i in range(voices)]
+        self._pitch = Sig([0]*voices)
+        # parameters shared by every voice, changed once for all of them
+        self._addursig = Sig(addur)
+        self._reldursig = Sig(reldur)
+        self._sustain = Sig(self._sustainvalue)
+        self._voices = [MidiEnv(vel, adtable, reltable, addur=self._addursig, reldur=self._reldursig,
+                                sustain=self._sustain) for vel in self._velocities]
+        self._released = TrigFunc([voice._relenv["trig"] for voice in self._voices], function=self._releaseEnd,
+                                  arg=list(range(voices)))
+        self._notes = [None]*voices # pitch of the note of each voice, None if free
+        self._held = [False]*voices
+        self._ages = [0]*voices
+        self._count = 0
+        self._next = 0
+        self._pending = [None]*voices # velocity of the notes waiting for a stolen voice to go through 0
+        self._calls = [None]*voices
+        self._out = Sig(self._voices, mul=mul, add=add)
+        self._base_objs = self._out.getBaseObjects()
+        # voices play for a few buffers, so that their note on detectors(Thresh) see the input at rest
+        self._buffer = self.getServer().getBufferSize()/float(self.getServer().getSamplingRate())
+        self._stopcall = CallAfter(self._stopFree, time=2*self._buffer)
+
+    def _stopFree(self):
+        for i, voice in enumerate(self._voices):
+            if self._notes[i] is None:
+                voice.stop()
+                self._velocities[i].stop()
+                if self._function is not None:
+                    self._function(i, False)
+
+    def _releaseEnd(self, i):
+        if self._notes[i] is not None and not self._held[i] and self._pending[i] is None:
+            self._notes[i] = None
+            self._voices[i].stop()
+            self._velocities[i].stop()
+            if self._function is not None:
+                self._function(i, False)
+
+    def _allocate(self):
+        n = len(self._voices)
+        free = [i for i in range(n) if self._notes[i] is None]
+        if self._policy == "roundrobin":
+            order = [(self._next + k) % n for k in range(n)]
+            i = next((j for j in order if j in free), order[0])
+            self._next = (i + 1) % n
+            return i
+        if free:
+            return free[0]
+        released = [i for i in range(n) if not self._held[i]]
+        candidates = released or list(range(n))
+        if self._policy == "oldest":
+            return min(candidates, key=lambda i: self._ages[i])
+        levels = self._out.get(all=True)
+        return min(candidates, key=lambda i: abs(levels[i]))
+
+    def _start(self, i):
+        velocity, self._pending[i] = self._pending[i], None
+        self._velocities[i].value = velocity
+
+    def noteon(self, pitch, velocity=1):
+        """
+        Start a note on a voice of the pool, returns the index of the voice.
+
+        :Args:
+
+            pitch : float
+                Pitch of the note, used to find the voice in `noteoff` and stored in `pitch`.
+            velocity : float, optional
+                Amplitude of the note, greater than 0. Defaults to 1.
+
+        """
+        i = self._allocate()
+        stolen = self._notes[i] is not None
+        self._notes[i] = pitch
+        self._held[i] = True
+        self._count += 1
+        self._ages[i] = self._count
+        self._pitch[i].setValue(pitch)
+        if not stolen:
+            self._velocities[i].play()
+            self._voices[i].play()
+            if self._function is not None:
+                self._function(i, True)
+            self._velocities[i].value = velocity
+        elif self._velocities[i].value != 0:
+            # the envelope restarts on a rising input: go through 0 for one buffer first
+            self._velocities[i].value = 0
+            self._pending[i] = velocity
+            self._calls[i] = CallAfter(self._start, time=self._buffer, arg=i)
+        else:
+            self._velocities[i].value = velocity
+        return i
+
+    def noteoff(self, pitch):
+        """
+        Release the most recent held note of pitch `pitch`, returns the index of its voice(None if not found).
+
+        :Args:
+
+            pitch : float
+                Pitch of the note given to `noteon`.
+
+        """
+        held = [i for i in range(len(self._voices)) if self._held[i] and self._notes[i] == pitch]
+        if not held:
+            return None
+        i = max(held, key=lambda i: self._ages[i])
+        self._held[i] = False
+        if self._pending[i] is not None:
+            self._pending[i] = 0
+        else:
+            self._velocities[i].value = 0
+        return i
+
+    def getActiveVoices(self):
+        """Return the number of voices currently playing(held or releasing)."""
+        return sum(1 for note in self._notes if note is not None)
+
+    def setPolicy(self, x):
+        """
+        Replace the `policy` attribute.
+
+        :Args:
+
+            x : string
+                "roundrobin", "oldest" or "quietest".
+
+        """
+        if x not in ("roundrobin", "oldest", "quietest"):
+            raise Exception("Invalid voice allocation policy '%s'"%(x,))
+        self._policy = x
+
+    def setAttackDecayDur(self, x):
+        """
+        Replace the `addur` attribute.
+
+        :Args:
+
+            x : float
+                new `addur` attribute.
+
+        """
+        self._addur = x
+        self._addursig.value = x
+
+    def setReleaseDur(self, x):
+        """
+        Replace the `reldur` attribute.
+
+        :Args:
+
+            x : float
+                new `reldur` attribute.
+
+        """
+        self._reldur = x
+        self._reldursig.value = x
+
+    def setSustain(self, x):
+        """
+        Replace the `sustain` attribute, for every voice.
+
+        :Args:
+
+            x : float
+                new sustain level.
+
+        """
+        self._sustainvalue = x
+        self._sustain.value = x
+
+    def out(self, chnl=0, inc=1, dur=0, delay=0):
+        return self.play(dur, delay)
+
+    @property
+    def pitch(self):
+        """Sig. Pitch of the note of each voice."""
+        return self._pitch
+
+    @property
+    def policy(self):
+        """string. Voice allocation policy."""
+        return self._policy
+
+    @policy.setter
+    def policy(self, x): self.setPolicy(x)
+
+    @property
+    def sustain(self):
+        """float. Sustain level of every voice."""
+        return self._sustainvalue
+
+    @sustain.setter
+    def sustain(self, x): self.setSustain(x)
+
+    @property
+    def addur(self):
+        return self._addur
+
+    @addur.setter
+    def addur(self, x):
+        self.setAttackDecayDur(x)
+
+    @property
+    def reldur(self):
+        return self._reldur
+
+    @reldur.setter
+    def reldur(self, x):
+        self.setReleaseDur(x)
@@ -1,4 +1,7 @@
 #from pyo import *
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
 
 def find(pred, lst):
     for i in range(len(lst)):
@@ -7,6 +10,40 @@ def find(pred, lst):
     else:
         return None
 
+def _plainValue(value):
+    """Return 'value' if it is a number or a list of numbers, None otherwise."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    elif isinstance(value, (list, tuple)) and all(isinstance(x, (int, float)) for x in value):
+        return list(value)
+    else:
+        return None
+
+def dumpSnapshot(snapshot):
+    """Serialize a snapshot returned by ModMatrix.snapshot() to a compact JSON string.
+    Previous values which are not numbers(e.g. pyo objects) are stored as null."""
+    return json.dumps([[src, dest, parameter, _plainValue(prev)] for (src, dest, parameter, prev) in snapshot],
+                      separators=(',', ':'))
+
+def loadSnapshot(data):
+    """Build a snapshot, usable by ModMatrix.restore(), from a string made by dumpSnapshot()."""
+    return tuple((src, dest, parameter, tuple(prev) if isinstance(prev, list) else prev)
+                 for (src, dest, parameter, prev) in json.loads(data))
+
+class ModBatch(object):
+    """Change set recorded by ModMatrix.batch(). Links and unlinks
+    are only stored, and applied all at once by the matrix when the batch ends."""
+    def __init__(self):
+        self.changes = []
+
+    def link(self, src, dest, parameter):
+        """Record a link from 'src' to the parameter 'parameter' of 'dest'."""
+        self.changes.append((src, dest, parameter))
+
+    def unlink(self, dest, parameter):
+        """Record the removal of the modulation on the parameter 'parameter' of 'dest'."""
+        self.changes.append((None, dest, parameter))
+
 class ModMatrix(object):
     """Modulation matrix. Interface to manage a complex network of 
     signal souces and destinations, i.e. signal generators which can modulate
@@ -18,13 +55,34 @@ class ModMatrix(object):
     unregistering the link). Also offers methods to query the ModMatrix instance for information about which object
     modulate which parameter of which other object.
     Also offers a textual representation of the modulation matrix, 
-    which is more compact and easier to read than the code of a whole program"""
-    def __init__(self, objects=None):
-        self._links = []
+    which is more compact and easier to read than the code of a whole program.
+
+    Optionally, some objects can be designated as outputs(see 'setOutputs'):
+    objects which then modulate no output, directly or not, are stopped
+    until they are linked back to one."""
+    def __init__(self, objects=None, outputs=None):
+        self._links = OrderedDict() # (dest, parameter) -> (src, dest, parameter, old_value)
+        self._sources = {} # src -> set of (dest, parameter)
+        self._destinations = {} # dest -> set of parameter
+        self._reprs = {} # name -> cached textual entry, see __str__
+        self._downstream = {} # name -> cached downstream set, updated in place when links change
+        self._upstream = {} # name -> cached upstream set, updated in place when links change
+        self._cycles = None # cached feedback cycles, None when unknown
+        self._reachable = None # names reachable from the outputs, updated when links change(None when automatic pausing is off)
+        self._changed = set() # names whose reachability changed since the last automatic pausing pass
+        self._outputs = None # names of the output objects, None when automatic pausing is off
+        self._idle = set() # names of the objects stopped by automatic pausing
+        self._pauses = 0
+        self._resumes = 0
         if objects is not None:
             self._namespace = dict(objects)
         else:
             self._namespace = {}
+        # topological positions, kept valid as links are added(None while the graph has cycles)
+        self._position = dict((name, i) for i, name in enumerate(self._namespace))
+        self._nextPosition = len(self._position)
+        if outputs is not None:
+            self.setOutputs(outputs)
 
     def add(self, name, object):
         """Add object to namespace. If 'name' already in namespace,
@@ -39,6 +97,13 @@ class ModMatrix(object):
             raise Exception("Cannot register '%s', name already in namespace."%(name))
         else:
             self._namespace[name] = object
+            self._reprs.pop(name, None)
+            if self._position is not None:
+                self._position[name] = self._nextPosition
+                self._nextPosition += 1
+            if self._reachable is not None:
+                self._changed.add(name)
+            self._autopause()
 
     def remove(self, name):
         if name not in self._namespace:
@@ -46,7 +111,19 @@ class ModMatrix(object):
         else:
             self.unlinkAll(name)
             self.retire(name)
+            if name in self._idle:
+                self._resume(name)
+            if self._outputs is not None:
+                self._outputs.discard(name)
             del self._namespace[name]
+            self._reprs.pop(name, None)
+            self._downstream.pop(name, None)
+            self._upstream.pop(name, None)
+            if self._position is not None:
+                del self._position[name]
+            if self._reachable is not None:
+                self._reachable.discard(name)
+            self._changed.discard(name)
 
     def __getitem__(self,key):
         return self._namespace[key]
@@ -78,16 +155,18 @@ class ModMatrix(object):
 
         parameter : string, name of parameter of 'src' object."""
         if not (src in self._namespace and dest in self._namespace):
-            raise Exception("There is no entry '%s' in this modulatio matrix."%(src if src in self._matrix else dest))
+            raise Exception("There is no entry '%s' in this modulatio matrix."%(dest if src in self._namespace else src))
         else:
             src_ref, dest_ref = self._namespace[src], self._namespace[dest]
             if not hasattr(dest_ref,parameter):
                 raise Exception("Invalid attribute '%s' for object %s"%(parameter, dest))
             else:
-                self.unlink(dest, parameter) # undo previous links to this destination and parameter
+                if self.isModulated(dest, parameter): # undo previous links to this destination and parameter
+                    setattr(dest_ref, parameter, self._popLink((dest, parameter))[3])
                 #We add an entry into the table: (source, destination, parameter, old_value)
-                self._links.append((src, dest, parameter, getattr(dest_ref, parameter)))
+                self._addLink((src, dest, parameter, getattr(dest_ref, parameter)))
                 setattr(dest_ref, parameter, src_ref)
+                self._autopause()
         
     def unlink(self, dest, parameter):
         """Remove modulation on a specific parameter for an object in the matrix,
@@ -102,9 +181,9 @@ class ModMatrix(object):
         elif not hasattr(self._namespace[dest],parameter):
             raise Exception("No parameter %s for object %s"%(parameter, dest))
         elif self.isModulated(dest, parameter):
-            pos = next(self._getIndices(dest=dest, parameter=parameter))
-            src, dest, parameter, prev = self._links.pop(pos)
+            src, dest, parameter, prev = self._popLink((dest, parameter))
             setattr(self._namespace[dest], parameter, prev) # set parameter of 'dest' to previous value
+            self._autopause()
 
     def unlinkAll(self, dest):
         """Remove all modulations on the object 'dest' from this matrix,
@@ -114,72 +193,466 @@ class ModMatrix(object):
         if dest not in self._namespace:
             raise Exception("No entry %s in namespace"%(dest))
         else:
-            offset = 0
-            for i in self._getIndices(dest=dest):
-                src, dest, parameter, prev = self._links.pop(i-offset)
+            for key in tuple(self._getKeys(dest=dest)):
+                src, dest, parameter, prev = self._popLink(key)
                 setattr(self._namespace[dest], parameter, prev) # set parameter of 'dest' to previous value
-                offset += 1
+            self._autopause()
 
     def retire(self, src):
         """Remove all modulation destinations for source."""
         if src not in self._namespace:
             raise Exception("No entry %s in namespace"%(src))
         else:
-            offset = 0
-            for i in self._getIndices(src=src):
-                src, dest, parameter, prev = self._links.pop(i-offset)
+            for key in tuple(self._getKeys(src=src)):
+                src, dest, parameter, prev = self._popLink(key)
                 setattr(self._namespace[dest], parameter, prev) # set parameter of 'dest' to previous value
-                offset += 1
-        
-    def _getIndices(self, src=None, dest=None, parameter=None):
-        if src is None and dest is None and parameter is None:
-            return iter(self._links)
-        elif src is None:
-            if dest is None:
-                return (i for i in range(len(self._links)) if self._links[i][2] == parameter)
-            elif parameter is None:
-                return (i for i in range(len(self._links)) if self._links[i][1] == dest)
+            self._autopause()
+
+    def _addLink(self, entry):
+        """Register a link entry (src, dest, parameter, prev) in the table and its indexes.
+        The (dest, parameter) slot must be free."""
+        src, dest, parameter, prev = entry
+        key = (dest, parameter)
+        new = not self._hasEdge(src, dest)
+        self._links[key] = entry
+        self._sources.setdefault(src, set()).add(key)
+        self._destinations.setdefault(dest, set()).add(parameter)
+        self._reprs.pop(src, None)
+        self._reprs.pop(dest, None)
+        if new:
+            self._edgeAdded(src, dest)
+
+    def _popLink(self, key):
+        """Unregister the link on the (dest, parameter) slot 'key' and return its entry."""
+        entry = self._links.pop(key)
+        src, dest, parameter, prev = entry
+        keys = self._sources[src]
+        keys.discard(key)
+        if not keys:
+            del self._sources[src]
+        params = self._destinations[dest]
+        params.discard(parameter)
+        if not params:
+            del self._destinations[dest]
+        self._reprs.pop(src, None)
+        self._reprs.pop(dest, None)
+        if not self._hasEdge(src, dest):
+            self._edgeRemoved(src, dest)
+        return entry
+
+    def _hasEdge(self, src, dest):
+        """Return True if 'src' modulates at least one parameter of 'dest'."""
+        return any(self._links[(dest, p)][0] == src for p in self._destinations.get(dest, ()))
+
+    def _edgeAdded(self, src, dest):
+        """Update the graph caches for a new edge src -> dest: objects upstream of 'src' now
+        also reach 'dest' and its downstream objects, objects downstream of 'dest' are now also
+        reached by 'src' and its upstream objects."""
+        down = up = None
+        for name, names in self._downstream.items():
+            if name == src or src in names:
+                if down is None:
+                    down = self._reach(dest, self._successors) | set([dest])
+                names.update(down)
+        for name, names in self._upstream.items():
+            if name == dest or dest in names:
+                if up is None:
+                    up = self._reach(src, self._predecessors) | set([src])
+                names.update(up)
+        if self._position is None:
+            self._cycles = None
+        self._reorder(src, dest)
+        if self._reachable is not None and dest in self._reachable and src not in self._reachable:
+            gained = self._reach(src, self._predecessors, lambda n: n not in self._reachable) | set([src])
+            self._reachable.update(gained)
+            self._changed.update(gained)
+
+    def _edgeRemoved(self, src, dest):
+        """Update the graph caches for the removal of the edge src -> dest:
+        only the sets which may have gone through it are dropped, a topological order stays valid."""
+        for name in [n for n, names in self._downstream.items() if n == src or src in names]:
+            del self._downstream[name]
+        for name in [n for n, names in self._upstream.items() if n == dest or dest in names]:
+            del self._upstream[name]
+        if self._cycles:
+            self._cycles = None
+        if self._reachable is not None and src in self._reachable:
+            self._unreach(src)
+
+    def _unreach(self, src):
+        """Update the reachable names after 'src' lost an edge: only 'src' and the reachable names upstream of it
+        may have lost their path to an output, they keep it if they are an output or have another reachable successor."""
+        candidates = self._reach(src, self._predecessors, lambda n: n in self._reachable) | set([src])
+        kept = set(n for n in candidates if n in self._outputs or
+                   any(d in self._reachable and d not in candidates for d in self._successors(n)))
+        stack = list(kept)
+        while stack:
+            for other in self._predecessors(stack.pop()):
+                if other in candidates and other not in kept:
+                    kept.add(other)
+                    stack.append(other)
+        lost = candidates - kept
+        self._reachable.difference_update(lost)
+        self._changed.update(lost)
+
+    def _reorder(self, src, dest):
+        """Keep the topological positions valid after adding the edge src -> dest(Pearce-Kelly):
+        only the objects positioned between 'dest' and 'src' are moved.
+        The positions are dropped if the edge closes a cycle."""
+        position = self._position
+        if position is None or position[src] < position[dest]:
+            return
+        lower, upper = position[dest], position[src]
+        forward = self._reach(dest, self._successors, lambda n: position[n] <= upper) | set([dest])
+        if src in forward:
+            self._position = None
+            self._cycles = None
+            return
+        backward = self._reach(src, self._predecessors, lambda n: position[n] >= lower) | set([src])
+        names = sorted(backward, key=position.get) + sorted(forward, key=position.get)
+        for name, p in zip(names, sorted(position[n] for n in names)):
+            position[name] = p
+
+    def _getKeys(self, src=None, dest=None, parameter=None):
+        """Iterate on the (dest, parameter) keys of the links matching the query,
+        using the source and destination indexes when possible."""
+        if dest is not None:
+            if parameter is not None:
+                keys = ((dest, parameter),) if (dest, parameter) in self._links else ()
             else:
-                return (i for i in range(len(self._links)) if self._links[i][1] == dest and self._links[i][2] == parameter)
-        elif dest is None:
+                keys = ((dest, p) for p in self._destinations.get(dest, ()))
+            if src is None:
+                return iter(keys)
+            return (k for k in keys if self._links[k][0] == src)
+        elif src is not None:
+            keys = self._sources.get(src, ())
             if parameter is None:
-                return (i for i in range(len(self._links)) if self._links[i][0] == src)
-            else:
-                return (i for i in range(len(self._links)) if self._links[i][0] == src and self._links[i][2] == parameter)
-        elif parameter is None:
-            return (i for i in range(len(self._links)) if self._links[i][0] == src and self._links[i][1] == dest)
+                return iter(keys)
+            return (k for k in keys if k[1] == parameter)
+        elif parameter is not None:
+            return (k for k in self._links if k[1] == parameter)
         else:
-            return (i for i in range(len(self._links)) if self._links[i][0] == src and self._links[i][1] == dest and self._links[i][2] == parameter)
+            return iter(self._links)
 
     def getEntries(self, src=None, dest=None, parameter=None):
-        return map(lambda x:self._links[x], self._getIndices(src=src, dest=dest, parameter=parameter))
+        """Iterate on the link entries (src, dest, parameter, prev) matching the query."""
+        return (self._links[k] for k in self._getKeys(src=src, dest=dest, parameter=parameter))
 
     def isModulated(self, dest, parameter):
-        return len(tuple(self._getIndices(dest=dest, parameter=parameter))) > 0
+        return (dest, parameter) in self._links
+
+    def apply(self, changes):
+        """Apply a set of link changes in a single pass.
+        The whole set is validated first, then compared to the current links,
+        so that only the net changes are set on the objects(e.g. unlinking then relinking
+        the same source does nothing). If setting a parameter fails,
+        the changes already made are rolled back and the exception is raised again.
+
+        changes : iterable of (src, dest, parameter) tuples. A 'src' of None
+        means that the parameter 'parameter' of 'dest' is unlinked."""
+        target = OrderedDict()
+        for src, dest, parameter in changes:
+            if dest not in self._namespace:
+                raise Exception("No entry %s in namespace"%(dest))
+            elif src is not None and src not in self._namespace:
+                raise Exception("No entry %s in namespace"%(src))
+            elif not hasattr(self._namespace[dest], parameter):
+                raise Exception("Invalid attribute '%s' for object %s"%(parameter, dest))
+            target.pop((dest, parameter), None)
+            target[(dest, parameter)] = src # last change on a parameter wins
+
+        undo = []
+        try:
+            for key, src in target.items():
+                dest, parameter = key
+                entry = self._links.get(key)
+                if (entry[0] if entry is not None else None) == src:
+                    continue
+                dest_ref = self._namespace[dest]
+                undo.append((key, entry, getattr(dest_ref, parameter)))
+                if entry is not None:
+                    self._popLink(key)
+                    prev = entry[3] # relinking keeps the original value
+                else:
+                    prev = getattr(dest_ref, parameter)
+                if src is None:
+                    setattr(dest_ref, parameter, prev)
+                else:
+                    self._addLink((src, dest, parameter, prev))
+                    setattr(dest_ref, parameter, self._namespace[src])
+        except Exception:
+            for key, entry, value in reversed(undo):
+                if key in self._links:
+                    self._popLink(key)
+                if entry is not None:
+                    self._addLink(entry)
+                setattr(self._namespace[key[0]], key[1], value)
+            raise
+        self._autopause()
+
+    def snapshot(self):
+        """Return the current links, as an immutable tuple
+        of (src, dest, parameter, prev) entries."""
+        return tuple(self._links.values())
+
+    def restore(self, snapshot):
+        """Set the links of the matrix to those of 'snapshot'(as returned by
+        'snapshot' or 'loadSnapshot'), applying only the difference with the current links.
+        Previous values are those of the current objects, not those stored in the snapshot.
+
+        snapshot : iterable of (src, dest, parameter, prev) entries."""
+        changes = [(None, dest, parameter) for (dest, parameter) in self._links]
+        changes.extend((src, dest, parameter) for (src, dest, parameter, prev) in snapshot)
+        self.apply(changes)
+
+    @contextmanager
+    def batch(self):
+        """Context manager recording links and unlinks on a ModBatch object,
+        applied with a single call to 'apply' when the block exits without error.
+
+        >>> with matrix.batch() as b:
+        ...     b.link("lfo", "osc", "freq")
+        ...     b.unlink("osc", "mul")
+        """
+        changes = ModBatch()
+        yield changes
+        self.apply(changes.changes)
     
+    def _successors(self, name):
+        return set(dest for (dest, parameter) in self._sources.get(name, ()))
+
+    def _predecessors(self, name):
+        return set(self._links[(name, parameter)][0] for parameter in self._destinations.get(name, ()))
+
+    def _reach(self, name, neighbours, keep=None):
+        """Return the names reached from 'name' through 'neighbours', only going through those satisfying 'keep'."""
+        reached = set()
+        stack = [name]
+        while stack:
+            for other in neighbours(stack.pop()):
+                if other not in reached and (keep is None or keep(other)):
+                    reached.add(other)
+                    stack.append(other)
+        return reached
+
+    def downstream(self, name):
+        """Return the set of names modulated, directly or not, by the object 'name'."""
+        if name not in self._namespace:
+            raise Exception("No entry %s in namespace"%(name))
+        if name not in self._downstream:
+            self._downstream[name] = self._reach(name, self._successors)
+        return frozenset(self._downstream[name])
+
+    def upstream(self, name):
+        """Return the set of names modulating, directly or not, the object 'name'."""
+        if name not in self._namespace:
+            raise Exception("No entry %s in namespace"%(name))
+        if name not in self._upstream:
+            self._upstream[name] = self._reach(name, self._predecessors)
+        return frozenset(self._upstream[name])
+
+    def cycles(self):
+        """Return the feedback cycles of the modulation graph, as a list of sets of names
+        (strongly connected components with more than one object, or an object modulating itself).
+        Empty without search while the topological positions are valid."""
+        if self._position is not None:
+            return []
+        if self._cycles is None:
+            index, lowlink, onstack = {}, {}, set()
+            stack, found = [], []
+            for root in self._namespace:
+                if root in index:
+                    continue
+                index[root] = lowlink[root] = len(index)
+                stack.append(root)
+                onstack.add(root)
+                work = [(root, iter(self._successors(root)))]
+                while work:
+                    node, children = work[-1]
+                    for child in children:
+                        if child not in index:
+                            index[child] = lowlink[child] = len(index)
+                            stack.append(child)
+                            onstack.add(child)
+                            work.append((child, iter(self._successors(child))))
+                            break
+                        elif child in onstack:
+                            lowlink[node] = min(lowlink[node], index[child])
+                    else:
+                        work.pop()
+                        if work:
+                            parent = work[-1][0]
+                            lowlink[parent] = min(lowlink[parent], lowlink[node])
+                        if lowlink[node] == index[node]:
+                            component = set()
+                            while True:
+                                other = stack.pop()
+                                onstack.discard(other)
+                                component.add(other)
+                                if other == node:
+                                    break
+                            if len(component) > 1 or node in self._successors(node):
+                                found.append(frozenset(component))
+            self._cycles = found
+        return list(self._cycles)
+
+    def topologicalOrder(self):
+        """Return the names in namespace ordered such that every source comes before
+        the objects it modulates. Raise an exception if the graph has feedback cycles.
+        The order is maintained as links are added, and only recomputed after cycles were removed."""
+        if self._position is None:
+            indegree = dict((name, len(self._predecessors(name))) for name in self._namespace)
+            ready = [name for name in self._namespace if indegree[name] == 0]
+            order = []
+            while ready:
+                name = ready.pop()
+                order.append(name)
+                for dest in self._successors(name):
+                    indegree[dest] -= 1
+                    if indegree[dest] == 0:
+                        ready.append(dest)
+            if len(order) < len(self._namespace):
+                raise Exception("Modulation graph has feedback cycles: %s"%(", ".join(
+                    "(%s)"%(", ".join(sorted(c))) for c in self.cycles())))
+            self._position = dict((name, i) for i, name in enumerate(order))
+            self._nextPosition = len(order)
+        return sorted(self._namespace, key=self._position.get)
+
+    def setOutputs(self, outputs):
+        """Designate the output objects and turn automatic pausing on.
+        Objects which are neither an output nor a source, directly or not,
+        for an output are stopped, and played again when they become one.
+        Only objects which were playing are stopped.
+
+        Reachability is updated from each changed link, and after a link change only the objects
+        whose reachability changed are stopped or played(an unreachable object played again by hand
+        stays playing until then). 'apply' and 'batch' are the bulk path, with a single pass
+        for all their changes.
+
+        outputs : list of names in namespace, or None to turn automatic pausing off
+        (playing again all the objects it stopped)."""
+        if outputs is None:
+            self._outputs = None
+            self._reachable = None
+        else:
+            for name in outputs:
+                if name not in self._namespace:
+                    raise Exception("No entry %s in namespace"%(name))
+            self._outputs = set(outputs)
+            self._reachable = set(self._outputs)
+            for name in self._outputs:
+                self._reachable.update(self._reach(name, self._predecessors))
+            self._changed = set(self._namespace)
+        self._autopause()
+
+    def getOutputs(self):
+        """Return the names of the output objects, or None if automatic pausing is off."""
+        return None if self._outputs is None else frozenset(self._outputs)
+
+    def reachable(self):
+        """Return the set of names of the outputs and of their sources, direct or not.
+        All names in namespace if automatic pausing is off."""
+        if self._outputs is None:
+            return frozenset(self._namespace)
+        return frozenset(self._reachable)
+
+    def idle(self):
+        """Return the set of names of the objects currently stopped by automatic pausing."""
+        return frozenset(self._idle)
+
+    def idleStats(self):
+        """Return a dictionary with the number of objects currently 'idle' and 'active',
+        and the total number of 'pauses' and 'resumes' done by automatic pausing."""
+        return {"idle": len(self._idle), "active": len(self._namespace) - len(self._idle),
+                "pauses": self._pauses, "resumes": self._resumes}
+
+    def _resume(self, name):
+        self._idle.discard(name)
+        self._namespace[name].play()
+        self._resumes += 1
+
+    def _autopause(self):
+        """Stop the objects which became unreachable from the outputs,
+        and play again the stopped ones which became reachable."""
+        if self._outputs is None:
+            for name in list(self._idle):
+                self._resume(name)
+            self._changed.clear()
+            return
+        for name in self._changed:
+            if name in self._reachable:
+                if name in self._idle:
+                    self._resume(name)
+            elif name not in self._idle:
+                obj = self._namespace[name]
+                isPlaying = getattr(obj, "isPlaying", None)
+                if isPlaying is not None and isPlaying():
+                    obj.stop()
+                    self._idle.add(name)
+                    self._pauses += 1
+        self._changed.clear()
+
+    def adjacency(self):
+        """Return the modulation graph as a dictionary mapping each name in namespace
+        to a dictionary with a 'sources' list of (src, parameter) modulating it,
+        and a 'destinations' list of (dest, parameter) it modulates."""
+        return dict((name, {"sources": [(self._links[(name, p)][0], p) for p in self._destinations.get(name, ())],
+                            "destinations": list(self._sources.get(name, ()))})
+                    for name in self._namespace)
+
+    def toDot(self, name="modmatrix"):
+        """Return the modulation graph in the DOT language(graphviz),
+        one node per name in namespace and one edge labelled with the parameter per link."""
+        lines = ["digraph \"%s\" {"%(name)]
+        lines.extend("\t\"%s\";"%(obj) for obj in self._namespace)
+        lines.extend("\t\"%s\" -> \"%s\" [label=\"%s\"];"%(src, dest, parameter)
+                     for (src, dest, parameter, prev) in self._links.values())
+        lines.append("}")
+        return "\n".join(lines)
+
+    def _entryRepr(self, obj):
+        """Textual entry of 'obj' for __str__, cached until a link involving 'obj' changes."""
+        text = self._reprs.get(obj)
+        if text is None:
+            dests = ", ".join("%s(%s)"%(dest, param) for (dest, param) in self._sources.get(obj, ()))
+            srcs = ", ".join("%s(%s)"%(self._links[(obj, param)][0], param) for param in self._destinations.get(obj, ()))
+            text = "%s : %s\n\tsource for: %s\n\n\tdestination for: %s"%(obj, str(self._namespace[obj]), dests, srcs)
+            self._reprs[obj] = text
+        return text
+
     def __str__(self):
-        def source_repr(src):
-            dests = set(map(lambda x:(x[1], x[2]), self.getEntries(src=src)))
-            if len(dests) == 0:
-                yield ""
-            else:
-                for (dest, param) in dests:
-                    yield "%s(%s)"%(dest, param)
-                
-        def dest_repr(dest):
-            srcs = set(map(lambda x:(x[0], x[2]), self.getEntries(dest=dest)))
-            if len(srcs) == 0:
-                yield ""
-            else:
-                for (src, param) in srcs:
-                    yield "%s(%s)"%(src, param)
-        def entry():
-            if len(self._namespace) == 0:
-                yield "Nothing"
-            else:
-                for obj in self._namespace:
-                    yield "%s : %s\n\tsource for: %s\n\n\tdestination for: %s"%(obj, str(self._namespace[obj]),
-                                                                                ", ".join(source_repr(obj)),
-                                                                                ", ".join(dest_repr(obj)))
-        return "\n\n".join(entry())
-                
+        if len(self._namespace) == 0:
+            return "Nothing"
+        return "\n\n".join(self._entryRepr(obj) for obj in self._namespace)
+
+
+if __name__ == '__main__':
+    # Running as a script: link/unlink throughput benchmark on plain python objects
+    import time
+
+    class Dummy(object):
+        def __init__(self):
+            self.freq = 100
+            self.mul = 1
+
+    nroutes = 10000
+    m = ModMatrix(("obj%d"%i, Dummy()) for i in range(nroutes))
+    names = list(m)
+
+    t = time.time()
+    for i in range(nroutes):
+        m.link(names[i], names[(i+1)%nroutes], "freq")
+    elapsed = time.time() - t
+    print("link: %d routes in %.4fs (%d links/s)"%(nroutes, elapsed, nroutes/elapsed))
+
+    t = time.time()
+    for name in names:
+        m.isModulated(name, "freq")
+    elapsed = time.time() - t
+    print("isModulated: %d queries in %.4fs (%d queries/s)"%(nroutes, elapsed, nroutes/elapsed))
+
+    t = time.time()
+    for i in range(nroutes):
+        m.unlink(names[(i+1)%nroutes], "freq")
+    elapsed = time.time() - t
+    print("unlink: %d routes in %.4fs (%d unlinks/s)"%(nroutes, elapsed, nroutes/elapsed))
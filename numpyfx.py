@@ -0,0 +1,303 @@
+from __future__ import print_function
+
+import numpy as np
+
+##Block processing versions of Flanger, RingMod and Autowah with numpy, without pyo or an audio server.
+##Blocks are arrays of shape (frames,) or (frames, channels), parameters are floats or arrays
+##with one value per frame(and optionally per channel), like audio rate PyoObject parameters.
+##State is kept between calls to process, so a long signal can be processed block by block.
+
+def _param(x, shape):
+    """Broadcast parameter 'x' to the (frames, channels) 'shape' of a block."""
+    x = np.asarray(x, dtype=np.float64)
+    if x.ndim == 1 and x.shape[0] == shape[0] and shape[1] != shape[0]:
+        x = x[:, None]
+    return np.broadcast_to(x, shape)
+
+def _block(x):
+    """Return 'x' as a (frames, channels) float array, and whether it was one dimensional."""
+    x = np.asarray(x, dtype=np.float64)
+    return (x[:, None], True) if x.ndim == 1 else (x, False)
+
+class _Phase(object):
+    """Phase accumulator of a pyo oscillator, in single precision like pyo, wrapped within [0, period):
+    the phase of each frame is the sum of the previous frequencies."""
+    # frames accumulated at once, between wraps
+    _window = 4096
+
+    def __init__(self, period=1.):
+        self.period = period
+        self.phase = None
+
+    def __call__(self, freq, sr):
+        frames, chnls = freq.shape
+        if self.phase is None:
+            self.phase = np.zeros(chnls, dtype=np.float32)
+        inc = (freq * (self.period / float(sr))).astype(np.float32)
+        phase = np.empty((frames, chnls), dtype=np.float32)
+        for c in range(chnls):
+            pos, i = self.phase[c], 0
+            while i < frames:
+                acc = np.cumsum(np.concatenate([[pos], inc[i:i + self._window, c]]), dtype=np.float32)
+                out = np.nonzero((acc >= self.period) | (acc < 0))[0]
+                j = out[0] if len(out) else len(acc) - 1
+                phase[i:i + j, c] = acc[:j]
+                pos = np.float32(acc[j] - self.period * np.floor(acc[j] / self.period))
+                i += j
+            self.phase[c] = pos
+        return phase.astype(np.float64)
+
+def _sine(phase):
+    """Read pyo's Sine 512 points table at 'phase'(in table points), with linear interpolation."""
+    index = phase.astype(int)
+    table = np.sin(2 * np.pi * np.arange(513) / 512.)
+    return table[index] + (table[index + 1] - table[index]) * (phase - index)
+
+class NumpyRingMod(object):
+    """
+    Ring modulator, as RingMod: the input multiplied by a sine(LFO type 7 with sharp 0).
+
+    :Args:
+
+        freq : float or array, optional
+            Frequency, in cycles per second, of the modulator. Defaults to 100.
+        sr : int, optional
+            Sampling rate. Defaults to 44100.
+
+    """
+    def __init__(self, freq=100, sr=44100, mul=1, add=0):
+        self.freq = freq
+        self.sr = sr
+        self.mul = mul
+        self.add = add
+        self.reset()
+
+    def reset(self):
+        """Restart the modulator."""
+        self._phase = _Phase()
+
+    def process(self, x):
+        """Process block 'x', returns the output block, of the same shape."""
+        x, flat = _block(x)
+        mod = np.sin(2 * np.pi * self._phase(_param(self.freq, x.shape), self.sr))
+        y = x * mod * _param(self.mul, x.shape) + _param(self.add, x.shape)
+        return y[:, 0] if flat else y
+
+class NumpyFlanger(object):
+    """
+    Flanger effect, as Flanger: half the input plus half of it through a delay line
+    modulated by a sine between maxdelay*(1-depth) and maxdelay*(1+depth) seconds, with feedback.
+
+    Without feedback the block is processed in one pass, with feedback in chunks
+    as long as the shortest delay of the block, each chunk only reading delayed samples already computed.
+
+    :Args:
+
+        freq : float or array, optional
+            Frequency of the delay line modulation. Defaults to 1.
+        maxdelay : float or array, optional
+            Center delay, in seconds. Defaults to 0.005.
+        feedback : float or array, optional
+            Amount of output sent back in the delay line, between 0 and 1. Defaults to 0.
+        depth : float or array, optional
+            Amplitude of the delay line modulation, as a fraction of maxdelay. Defaults to 0.5.
+        sr : int, optional
+            Sampling rate. Defaults to 44100.
+
+    """
+    # size of the delay line in seconds, as pyo's Delay default maxdelay
+    _size = 1.
+
+    def __init__(self, freq=1, maxdelay=.005, feedback=0, depth=.5, sr=44100, mul=1, add=0):
+        self.freq = freq
+        self.maxdelay = maxdelay
+        self.feedback = feedback
+        self.depth = depth
+        self.sr = sr
+        self.mul = mul
+        self.add = add
+        self.reset()
+
+    def reset(self):
+        """Clear the delay line and restart the modulation."""
+        self._phase = _Phase(512)
+        self._history = None
+
+    def process(self, x):
+        """Process block 'x', returns the output block, of the same shape."""
+        x, flat = _block(x)
+        frames, chnls = x.shape
+        size = int(self._size * self.sr)
+        if self._history is None:
+            self._history = np.zeros((size + 1, chnls))
+        maxdelay = _param(self.maxdelay, x.shape)
+        lfo = _sine(self._phase(_param(self.freq, x.shape), self.sr))
+        delay = np.clip((maxdelay + lfo * _param(self.depth, x.shape) * maxdelay) * self.sr, 1, size)
+        feedback = np.clip(_param(self.feedback, x.shape), 0, 1)
+        # delay line input(the input plus the feedback), history first then this block
+        line = np.vstack([self._history, np.zeros((frames, chnls))])
+        y = np.zeros((frames, chnls))
+        pos = np.arange(frames)[:, None] + self._history.shape[0] - delay
+        index = np.floor(pos).astype(int)
+        frac = pos - index
+        cols = np.arange(chnls)[None, :]
+        start = 0
+        while start < frames:
+            # frames until the first one reading a sample of the delay line not computed yet
+            stop = frames if not feedback.any() else min(frames, start + max(1, int(delay[start:].min())))
+            line[self._history.shape[0] + start:self._history.shape[0] + stop] = x[start:stop]
+            i, f = index[start:stop], frac[start:stop]
+            y[start:stop] = line[i, cols] + (line[i + 1, cols] - line[i, cols]) * f
+            line[self._history.shape[0] + start:self._history.shape[0] + stop] += y[start:stop] * feedback[start:stop]
+            start = stop
+        self._history = line[-(size + 1):]
+        out = (x + y) * 0.5 * _param(self.mul, x.shape) + _param(self.add, x.shape)
+        return out[:, 0] if flat else out
+
+class NumpyAutowah(object):
+    """
+    Auto-wah effect, as Autowah: a bandpass biquad filter, its center frequency following
+    the amplitude of the input(Follower), scaled between minfreq and maxfreq with an exponent 'curve'.
+
+    The follower(in closed form when folfreq is constant) and the filter coefficients are computed
+    for the whole block, the filter recursion runs frame by frame, on all channels at once.
+
+    :Args:
+
+        folfreq : float or array, optional
+            Cutoff frequency of the amplitude follower. Defaults to 30.
+        minfreq : float or array, optional
+            Filter frequency for an amplitude of 0. Defaults to 20.
+        maxfreq : float or array, optional
+            Filter frequency for an amplitude of 1. Defaults to 2000.
+        q : float or array, optional
+            Filter quality. Defaults to 5.
+        curve : float, optional
+            Exponent of the amplitude to frequency scaling. Defaults to 1.
+        sr : int, optional
+            Sampling rate. Defaults to 44100.
+
+    """
+    def __init__(self, folfreq=30, minfreq=20, maxfreq=2000, q=5, curve=1, sr=44100, mul=1, add=0):
+        self.folfreq = folfreq
+        self.minfreq = minfreq
+        self.maxfreq = maxfreq
+        self.q = q
+        self.curve = curve
+        self.sr = sr
+        self.mul = mul
+        self.add = add
+        self.reset()
+
+    def reset(self):
+        """Clear the follower and filter states."""
+        self._follow = None
+        self._filter = None
+
+    def _follower(self, x):
+        """Amplitude follower, as pyo's Follower: a one pole lowpass filter of the absolute value of 'x'."""
+        frames, chnls = x.shape
+        if self._follow is None:
+            self._follow = np.zeros(chnls)
+        b = 2. - np.cos(2 * np.pi * np.clip(_param(self.folfreq, x.shape), 0, self.sr / 2.) / self.sr)
+        c = b - np.sqrt(b * b - 1.)
+        absin = np.abs(x)
+        follow = np.empty_like(x)
+        value = self._follow
+        if np.ndim(self.folfreq) == 0 and 0 < c[0, 0] < 1:
+            # constant coefficient: y[n] = c**(n+1)*y[-1] + (1-c)*sum(c**(n-k)*x[k]), in chunks short enough
+            # for c**-n to stay small
+            c = c[0, 0]
+            length = max(1, int(10. / -np.log(c)))
+            for start in range(0, frames, length):
+                u = absin[start:start + length]
+                n = np.arange(1, len(u) + 1)[:, None]
+                follow[start:start + length] = c ** n * (value + (1 - c) * np.cumsum(u * c ** -n, axis=0))
+                value = follow[start + len(u) - 1]
+        else:
+            for n in range(frames):
+                value = absin[n] + c[n] * (value - absin[n])
+                follow[n] = value
+        self._follow = value
+        return follow
+
+    def process(self, x):
+        """Process block 'x', returns the output block, of the same shape."""
+        x, flat = _block(x)
+        frames, chnls = x.shape
+        if self._filter is None:
+            # like pyo's Biquad, the filter starts as if the first sample had always been there
+            self._filter = np.tile(x[0], (4, 1))
+        amp = np.clip(self._follower(x), 0, 1)
+        if self.curve != 1:
+            amp = amp ** self.curve
+        minfreq = _param(self.minfreq, x.shape)
+        freq = np.clip(minfreq + amp * (_param(self.maxfreq, x.shape) - minfreq), 1, self.sr / 2.)
+        w0 = 2 * np.pi * freq / self.sr
+        alpha = np.sin(w0) / (2 * np.clip(_param(self.q, x.shape), 0.1, None))
+        a0 = 1. / (1 + alpha)
+        b0, a1, a2 = alpha * a0, -2 * np.cos(w0) * a0, (1 - alpha) * a0
+        x1, x2, y1, y2 = self._filter
+        y = np.empty_like(x)
+        for n in range(frames):
+            value = b0[n] * (x[n] - x2) - a1[n] * y1 - a2[n] * y2
+            x2, x1 = x1, x[n]
+            y2, y1 = y1, value
+            y[n] = value
+        self._filter = np.array([x1, x2, y1, y2])
+        out = y * _param(self.mul, x.shape) + _param(self.add, x.shape)
+        return out[:, 0] if flat else out
+
+def _pyoRender(s, make, x):
+    """Process the (frames, channels) array 'x' with the PyoObject returned by make(input), on the manual server 's'."""
+    from pyo import DataTable, TableRead, TableRec
+    frames, chnls = x.shape
+    s.boot()
+    s.start()
+    inputs = [DataTable(frames, init=list(x[:, c])) for c in range(chnls)]
+    source = TableRead(inputs, freq=inputs[0].getRate()).play()
+    obj = make(source)
+    outputs = [DataTable(frames) for c in range(chnls)]
+    rec = TableRec(obj, outputs).play()
+    for i in range(frames // s.getBufferSize() + 1):
+        s.process()
+    y = np.array([t.getTable() for t in outputs]).T
+    s.shutdown()
+    return y
+
+def check(dur=1., sr=44100, blocksize=1000, tolerance=1e-3):
+    """Process 'dur' seconds of a stereo test signal in blocks of 'blocksize' frames
+    with each numpy effect and with its pyo version, print their maximum difference and
+    raise an Exception if it exceeds 'tolerance'."""
+    from pyo import Server
+    from flanger import Flanger
+    from ringmod import RingMod
+    from autowah import Autowah
+    frames = int(dur * sr)
+    t = np.arange(frames) / float(sr)
+    rng = np.random.RandomState(1)
+    x = np.vstack([0.5 * np.sin(2 * np.pi * 220 * t) * np.sin(2 * np.pi * 2 * t), 0.3 * rng.uniform(-1, 1, frames)]).T
+    s = Server(sr=sr, nchnls=2, buffersize=64, duplex=0, audio="manual")
+    effects = [
+        ("RingMod", lambda src: RingMod(src, freq=[300, 470], mul=0.8), NumpyRingMod(freq=[300, 470], sr=sr, mul=0.8)),
+        ("Flanger", lambda src: Flanger(src, freq=0.5, depth=0.7), NumpyFlanger(freq=0.5, depth=0.7, sr=sr)),
+        ("Flanger feedback", lambda src: Flanger(src, freq=[2, 3], feedback=0.6, maxdelay=0.003),
+         NumpyFlanger(freq=[2, 3], feedback=0.6, maxdelay=0.003, sr=sr)),
+        ("Autowah", lambda src: Autowah(src, q=3), NumpyAutowah(q=3, sr=sr)),
+        ("Autowah curve", lambda src: Autowah(src, minfreq=100, maxfreq=4000, curve=2), NumpyAutowah(minfreq=100, maxfreq=4000, curve=2, sr=sr)),
+    ]
+    failed = []
+    for name, make, effect in effects:
+        expected = _pyoRender(s, make, x)
+        y = np.vstack([effect.process(x[i:i + blocksize]) for i in range(0, frames, blocksize)])
+        error = np.abs(y - expected).max()
+        print("%s: max difference %.2e(peak %.2f)"%(name, error, np.abs(expected).max()))
+        if error > tolerance:
+            failed.append(name)
+    if failed:
+        raise Exception("numpy effects differ from pyo: %s"%(", ".join(failed),))
+
+if __name__ == '__main__':
+    import sys
+    if "--check" in sys.argv:
+        check()
@@ -1,25 +1,65 @@
+from __future__ import print_function
+
 from pyo import *
+from midienv import *
+from tablecache import *
 
 class Operator(PyoObject):
-    """PM oscillator"""
-    def __init__(self, freq=440, pm=None, ratio=1, feedback=0, env=1, mul=1, add=0):
+    """PM oscillator
+
+    mode "sine"(default) is a Sine whose phase is an Interp of the scaled modulator and feedback(two Scale objects).
+    mode "wavetable" reads a sine table shared by every operator with a single Osc, its phase
+    being one Sig of the modulator, offset by one Sig of the feedback. The modulation is the same, up to a constant phase."""
+    def __init__(self, freq=440, pm=None, ratio=1, feedback=0, env=1, mode="sine", mul=1, add=0):
         PyoObject.__init__(self, mul, add)
         if pm is not None and not isinstance(pm, PyoObject):
             raise Exception("modulation source must be Pyo object")
+        if mode not in ("sine", "wavetable"):
+            raise Exception("Invalid operator mode '%s'"%(mode,))
         self._freq = freq
         self._ratio = ratio
         self._feedback = feedback
         self._env = env
         self._pm = pm
-        self._env = env
-        self._pmod = Scale(pm if pm is not None else Sig(0), inmin=-1, inmax=1, outmin=0, outmax=1, mul=env)
+        self._mode = mode
         if pm is not None:
             pm.freq = Sig(freq, mul=ratio)
-        self._carrier = Sine(freq=self._freq, mul=mul, add=add)
-        self._feedback_sig = Scale(self._carrier, inmin=-1, inmax=1, outmin=0, outmax=1, mul=feedback)
-        self._carrier.phase = Interp(self._pmod, self._feedback_sig, interp=0.5)
+        # input of the modulation when pm is None
+        self._zero = Sig(0) if mode == "sine" else None
+        # feedback and env scaled by 1/4 in "wavetable" mode
+        self._feedback_scale = Sig(feedback, mul=0.25) if mode == "wavetable" else None
+        self._env_scale = Sig(env, mul=0.25) if mode == "wavetable" else None
+        if mode == "sine":
+            self._pmod = Scale(pm if pm is not None else self._zero, inmin=-1, inmax=1, outmin=0, outmax=1, mul=env)
+            self._carrier = Sine(freq=self._freq, mul=mul, add=add)
+            self._feedback_sig = Scale(self._carrier, inmin=-1, inmax=1, outmin=0, outmax=1, mul=feedback)
+            self._phase = Interp(self._pmod, self._feedback_sig, interp=0.5)
+            self._carrier.phase = self._phase
+        else:
+            # phase = 0.5 + (env*pm + feedback*carrier)/4, within [0, 1] like the Interp of "sine" mode
+            self._feedback_sig = Sig(0, mul=self._feedback_scale, add=0.5)
+            self._pmod = Sig(pm if pm is not None else 0, mul=self._env_scale, add=self._feedback_sig)
+            self._phase = None
+            self._carrier = Osc(cachedTable(HarmTable, [1]), freq=self._freq, phase=self._pmod, mul=mul, add=add)
+            self._feedback_sig.value = self._carrier
         self._base_objs = self._carrier.getBaseObjects()
 
+    def __del__(self):
+        # the carrier and its feedback form a reference cycle, which pyo objects
+        # can not survive when collected by the garbage collector
+        if not hasattr(self, "_carrier"): # __init__ failed before building it
+            return
+        if self._mode == "sine":
+            self._carrier.phase = 0
+        else:
+            self._feedback_sig.value = 0
+
+    def _internals(self):
+        objs = [obj for obj in (self._zero, self._feedback_scale, self._env_scale, self._pmod, self._carrier, self._feedback_sig, self._phase) if obj is not None]
+        if self._pm is not None:
+            objs += [obj for obj in (self._pm, self._pm.freq) if isinstance(obj, PyoObject)]
+        return objs
+
     def setFreq(self, freq):
         self._freq = freq
         self._carrier.freq = freq
@@ -30,10 +70,12 @@ class Operator(PyoObject):
         if mod is not None and not isinstance(mod, PyoObject):
             raise Exception("modulation source must be Pyo object")
         self._pm = mod
-        if pm is not None:
+        if mod is not None:
             mod.freq = Sig(self._freq, mul=self._ratio)
-        mod = mod or Sig(0)
-        self._pmod.input = mod
+        if self._mode == "sine":
+            self._pmod.input = mod if mod is not None else self._zero
+        else:
+            self._pmod.value = mod if mod is not None else 0
         
     def setRatio(self, ratio):
         self._ratio = ratio
@@ -42,11 +84,17 @@ class Operator(PyoObject):
 
     def setFeedback(self, feedback):
         self._feedback = feedback
-        self._feedback_sig.mul = feedback
+        if self._mode == "sine":
+            self._feedback_sig.mul = feedback
+        else:
+            self._feedback_scale.value = feedback
 
     def setEnv(self, env):
         self._env = env
-        self._pmod.mul = env
+        if self._mode == "sine":
+            self._pmod.mul = env
+        else:
+            self._env_scale.value = env
         
     @property
     def freq(self):
@@ -88,16 +136,24 @@ class Operator(PyoObject):
     def env(self,x):
         self.setEnv(x)
 
+    @property
+    def mode(self):
+        """string. "sine" or "wavetable", set at creation."""
+        return self._mode
+
     def play(self, dur=0, delay=0):
-        self._carrier.play(dur, delay)
+        for obj in self._internals():
+            obj.play(dur, delay)
         return PyoObject.play(self, dur, delay)
 
     def stop(self):
-        self._carrier.stop()
+        for obj in self._internals():
+            obj.stop()
         return PyoObject.stop(self)
 
     def out(self, chnl=0, inc=1, dur=0, delay=0):
-        self._carrier.play(dur, delay)
+        for obj in self._internals():
+            obj.play(dur, delay)
         return PyoObject.out(self, chnl, inc, dur, delay)
 
     def sig(self):
@@ -114,3 +170,535 @@ class Operator(PyoObject):
 
         
             
+
+class PMAlgorithm(object):
+    """
+    Routing of the operators of a PMVoice(see PMVoice).
+
+    :Args:
+
+        matrix : list of lists of floats
+            Square matrix, matrix[i][j] is the modulation index of operator j on operator i(0 for none).
+            The diagonal must be 0, feedback is given by `feedback`.
+        outputs : list of floats
+            Output level of each operator, operators with a non-zero level are carriers.
+        feedback : list of floats, optional
+            Self modulation index of each operator. Defaults to None(no feedback).
+
+    """
+    def __init__(self, matrix, outputs, feedback=None):
+        self._size = len(matrix)
+        if any(len(row) != self._size for row in matrix) or len(outputs) != self._size:
+            raise Exception("PMAlgorithm matrix must be square, with one output level per operator")
+        if any(matrix[i][i] != 0 for i in range(self._size)):
+            raise Exception("PMAlgorithm matrix diagonal must be 0, use feedback for self modulation")
+        self._matrix = [list(row) for row in matrix]
+        self._outputs = list(outputs)
+        self._feedback = list(feedback) if feedback is not None else [0]*self._size
+        if len(self._feedback) != self._size:
+            raise Exception("PMAlgorithm needs one feedback index per operator")
+        self._order = self._sort()
+
+    def _sort(self):
+        """Operators reaching the output, modulators first(Kahn's algorithm)."""
+        used = set(i for i in range(self._size) if self._outputs[i] != 0)
+        stack = list(used)
+        while stack:
+            for j in self.modulators(stack.pop()):
+                if j not in used:
+                    used.add(j)
+                    stack.append(j)
+        pending = dict((i, len(self.modulators(i))) for i in used)
+        order = []
+        ready = sorted((i for i in used if pending[i] == 0), reverse=True)
+        while ready:
+            j = ready.pop()
+            order.append(j)
+            for i in sorted(used):
+                if self._matrix[i][j] != 0:
+                    pending[i] -= 1
+                    if pending[i] == 0:
+                        ready.append(i)
+        if len(order) != len(used):
+            raise Exception("PMAlgorithm modulation cycle between operators %s"%(sorted(used - set(order)),))
+        return order
+
+    def modulators(self, i):
+        """Return the operators modulating operator 'i', feedback excluded."""
+        return tuple(j for j in range(self._size) if self._matrix[i][j] != 0)
+
+    def index(self, i, j):
+        """Return the modulation index of operator 'j' on operator 'i', the feedback if i == j."""
+        return self._feedback[i] if i == j else self._matrix[i][j]
+
+    @property
+    def size(self):
+        """int. Number of operators."""
+        return self._size
+
+    @property
+    def order(self):
+        """list. Operators reaching the output, each after its modulators."""
+        return list(self._order)
+
+    @property
+    def outputs(self):
+        """list. Output level of each operator."""
+        return list(self._outputs)
+
+    @property
+    def feedback(self):
+        """list. Self modulation index of each operator."""
+        return list(self._feedback)
+
+class PMVoice(PyoObject):
+    """
+    Phase modulation voice with several operators, routed by a PMAlgorithm.
+
+    Each operator is a sine oscillator whose phase is the wrapped sum of its modulators
+    outputs times their modulation index. Only operators reaching the output are built,
+    modulators before the operators they modulate, so modulation has no delay(feedback has a one buffer delay).
+    The operators frequencies are the streams of a single Sig, and each operator output is read directly
+    by every operator it modulates.
+
+    Changing the algorithm keeps the operators whose modulators are unchanged and built before them,
+    only updating their modulation indexes, and rebuilds the others.
+
+    :Parent: :py:class:`PyoObject`
+
+    :Args:
+
+        freq : float or PyoObject, optional
+            Base frequency in cycles per second. Defaults to 440.
+        algorithm : PMAlgorithm
+            Routing of the operators.
+        ratios : float or list of floats, optional
+            Frequency of each operator, as a ratio of `freq`. Defaults to 1.
+        env : float, PyoObject or list, optional
+            Amplitude(envelope) of each operator. Defaults to 1.
+
+    .. note::
+
+        Carriers rebuilt by setAlgorithm reach the output one buffer late.
+
+    """
+    def __init__(self, freq=440, algorithm=None, ratios=1, env=1, mul=1, add=0):
+        PyoObject.__init__(self, mul, add)
+        if not isinstance(algorithm, PMAlgorithm):
+            raise Exception("PMVoice algorithm must be a PMAlgorithm")
+        self._freq = freq
+        self._size = algorithm.size
+        self._ratios = [wrap(ratios, i) for i in range(self._size)] if isinstance(ratios, list) else [ratios]*self._size
+        self._env = [wrap(env, i) for i in range(self._size)] if isinstance(env, list) else [env]*self._size
+        self._freqs = Sig(freq, mul=self._ratios)
+        self._ops = [None]*self._size
+        self._order = []
+        self._algorithm = None
+        self._build(algorithm)
+        self._output = Sig(self._sines(), mul=algorithm.outputs)
+        self._mix = Mix(self._output, voices=1, mul=mul, add=add)
+        self._base_objs = self._mix.getBaseObjects()
+
+    def _sines(self):
+        return [op["sine"] if op is not None else 0 for op in self._ops]
+
+    def _buildOp(self, i, algorithm):
+        """Build operator 'i' from its modulators, already built."""
+        mods = algorithm.modulators(i) + ((i,) if algorithm.feedback[i] != 0 else ())
+        op = {"mods": mods, "terms": None, "mix": None, "phase": None}
+        if mods:
+            # the feedback term is set once the oscillator exists, and is read one buffer late
+            op["terms"] = Sig([self._ops[j]["sine"] if j != i else 0 for j in mods],
+                              mul=[algorithm.index(i, j) for j in mods])
+            if len(mods) > 1:
+                op["mix"] = Mix(op["terms"], voices=1)
+            op["phase"] = Wrap(op["terms"] if op["mix"] is None else op["mix"], min=0, max=1)
+        op["sine"] = Sine(freq=self._freqs[i], phase=0 if op["phase"] is None else op["phase"], mul=self._env[i])
+        if i in mods:
+            op["terms"].value = [self._ops[j]["sine"] if j != i else op["sine"] for j in mods]
+        self._ops[i] = op
+
+    def _build(self, algorithm):
+        """Keep the operators still valid under 'algorithm', rebuild the others. Returns the removed operators."""
+        kept = []
+        for i in self._order:
+            op = self._ops[i]
+            mods = algorithm.modulators(i) + ((i,) if algorithm.feedback[i] != 0 else ())
+            if i in algorithm.order and op["mods"] == mods and all(j in kept for j in mods if j != i):
+                kept.append(i)
+                if op["terms"] is not None:
+                    op["terms"].mul = [algorithm.index(i, j) for j in mods]
+        removed = [self._ops[i] for i in self._order if i not in kept]
+        self._ops = [self._ops[i] if i in kept else None for i in range(self._size)]
+        self._order = kept + [i for i in algorithm.order if i not in kept]
+        for i in self._order[len(kept):]:
+            self._buildOp(i, algorithm)
+        self._algorithm = algorithm
+        return removed
+
+    def _release(self, op):
+        """Stop operator 'op' and break its feedback reference cycle,
+        which pyo objects can not survive when collected by the garbage collector."""
+        for key in ("terms", "mix", "phase", "sine"):
+            if op[key] is not None:
+                op[key].stop()
+        if op["terms"] is not None:
+            op["terms"].value = 0
+
+    def __del__(self):
+        # __init__ may have failed before building all the operators
+        ops = getattr(self, "_ops", ())
+        for i in getattr(self, "_order", ()):
+            if ops[i] is not None:
+                self._release(ops[i])
+
+    def _internals(self):
+        yield self._freqs
+        for i in self._order:
+            for key in ("terms", "mix", "phase", "sine"):
+                if self._ops[i][key] is not None:
+                    yield self._ops[i][key]
+        yield self._output
+
+    def setAlgorithm(self, x):
+        """
+        Replace the `algorithm` attribute.
+
+        :Args:
+
+            x : PMAlgorithm
+                new routing, with the same number of operators.
+
+        """
+        if not isinstance(x, PMAlgorithm) or x.size != self._size:
+            raise Exception("PMVoice algorithm must be a PMAlgorithm with %d operators"%(self._size,))
+        playing = self.isPlaying()
+        for op in self._build(x):
+            self._release(op)
+        self._output.value = self._sines()
+        self._output.mul = x.outputs
+        if not playing:
+            self.stop()
+
+    def getOrder(self):
+        """Return the indexes of the built operators, in processing order."""
+        return list(self._order)
+
+    def setFreq(self, x):
+        """
+        Replace the `freq` attribute.
+
+        :Args:
+
+            x : float or PyoObject
+                new `freq` attribute.
+
+        """
+        self._freq = x
+        self._freqs.value = x
+
+    def setRatios(self, x):
+        """
+        Replace the `ratios` attribute.
+
+        :Args:
+
+            x : float or list of floats
+                new frequency ratio of each operator.
+
+        """
+        self._ratios = [wrap(x, i) for i in range(self._size)] if isinstance(x, list) else [x]*self._size
+        self._freqs.mul = self._ratios
+
+    def setEnv(self, x):
+        """
+        Replace the `env` attribute.
+
+        :Args:
+
+            x : float, PyoObject or list
+                new amplitude of each operator.
+
+        """
+        self._env = [wrap(x, i) for i in range(self._size)] if isinstance(x, list) else [x]*self._size
+        for i in self._order:
+            self._ops[i]["sine"].mul = self._env[i]
+
+    def play(self, dur=0, delay=0):
+        for obj in self._internals():
+            obj.play(dur, delay)
+        return PyoObject.play(self, dur, delay)
+
+    def stop(self):
+        for obj in self._internals():
+            obj.stop()
+        return PyoObject.stop(self)
+
+    def out(self, chnl=0, inc=1, dur=0, delay=0):
+        for obj in self._internals():
+            obj.play(dur, delay)
+        return PyoObject.out(self, chnl, inc, dur, delay)
+
+    @property
+    def freq(self):
+        """float or PyoObject. Base frequency."""
+        return self._freq
+
+    @freq.setter
+    def freq(self, x): self.setFreq(x)
+
+    @property
+    def algorithm(self):
+        """PMAlgorithm. Routing of the operators."""
+        return self._algorithm
+
+    @algorithm.setter
+    def algorithm(self, x): self.setAlgorithm(x)
+
+    @property
+    def ratios(self):
+        """list. Frequency ratio of each operator."""
+        return self._ratios
+
+    @ratios.setter
+    def ratios(self, x): self.setRatios(x)
+
+    @property
+    def env(self):
+        """list. Amplitude of each operator."""
+        return self._env
+
+    @env.setter
+    def env(self, x): self.setEnv(x)
+
+class PolyPM(PyoObject):
+    """
+    Polyphonic two operator PM instrument, with a fixed pool of preallocated voices.
+
+    Each voice is a carrier Operator modulated by an Operator, with its amplitude
+    given by a voice of a PolyMidiEnv, which assigns the notes to the voices.
+    The operators of a voice are stopped with its envelope, at the end of its release,
+    so the CPU used depends on the number of notes playing, not on the number of voices.
+
+    :Parent: :py:class:`PyoObject`
+
+    :Args:
+
+        adtable : PyoTableObject
+            Attack/decay envelope, its last point being the sustain level.
+        reltable : PyoTableObject
+            Release envelope.
+        voices : int, optional
+            Number of voices. Defaults to 8.
+        ratio : float or PyoObject, optional
+            Frequency of the modulator, as a ratio of the note frequency. Defaults to 1.
+        index : float or PyoObject, optional
+            Modulation depth. Defaults to 1.
+        feedback : float or PyoObject, optional
+            Feedback of the modulator. Defaults to 0.
+        addur : float, optional
+            Duration of the attack/decay phase, in seconds. Defaults to 0.5.
+        reldur : float, optional
+            Duration of the release phase, in seconds. Defaults to 0.5.
+        policy : string, optional
+            Voice stealing policy, see PolyMidiEnv. Defaults to "oldest".
+        mode : string, optional
+            Operator mode, "sine" or "wavetable". Defaults to "sine".
+
+    """
+    def __init__(self, adtable, reltable, voices=8, ratio=1, index=1, feedback=0, addur=.5, reldur=.5,
+                 policy="oldest", mode="sine", mul=1, add=0):
+        PyoObject.__init__(self, mul, add)
+        self._ratio = ratio
+        self._index = index
+        self._feedback = feedback
+        # parameters shared by every voice
+        self._ratiosig = Sig(ratio)
+        self._indexsig = Sig(index)
+        self._feedbacksig = Sig(feedback)
+        self._env = PolyMidiEnv(adtable, reltable, voices=voices, addur=addur, reldur=reldur, policy=policy,
+                                function=self._voice)
+        self._freqs = MToF(self._env.pitch)
+        self._voices = []
+        for i in range(voices):
+            mod = Operator(freq=self._freqs[i], feedback=self._feedbacksig, mode=mode)
+            self._voices.append(Operator(freq=self._freqs[i], pm=mod, ratio=self._ratiosig, env=self._indexsig,
+                                         mode=mode, mul=self._env[i]))
+        self._mix = Mix(self._voices, voices=1, mul=mul, add=add)
+        self._base_objs = self._mix.getBaseObjects()
+
+    def _voice(self, i, active):
+        if active:
+            self._voices[i].play()
+        else:
+            self._voices[i].stop()
+
+    def noteon(self, pitch, velocity=1):
+        """
+        Start a note, returns the index of its voice.
+
+        :Args:
+
+            pitch : float
+                Midi pitch of the note.
+            velocity : float, optional
+                Amplitude of the note, greater than 0. Defaults to 1.
+
+        """
+        return self._env.noteon(pitch, velocity)
+
+    def noteoff(self, pitch):
+        """
+        Release the most recent held note of pitch `pitch`, returns the index of its voice(None if not found).
+
+        :Args:
+
+            pitch : float
+                Midi pitch of the note.
+
+        """
+        return self._env.noteoff(pitch)
+
+    def getActiveVoices(self):
+        """Return the number of voices currently playing(held or releasing)."""
+        return self._env.getActiveVoices()
+
+    def setPolicy(self, x):
+        """
+        Replace the `policy` attribute.
+
+        :Args:
+
+            x : string
+                "roundrobin", "oldest" or "quietest".
+
+        """
+        self._env.setPolicy(x)
+
+    def setRatio(self, x):
+        """
+        Replace the `ratio` attribute.
+
+        :Args:
+
+            x : float or PyoObject
+                new `ratio` attribute.
+
+        """
+        self._ratio = x
+        self._ratiosig.value = x
+
+    def setIndex(self, x):
+        """
+        Replace the `index` attribute.
+
+        :Args:
+
+            x : float or PyoObject
+                new `index` attribute.
+
+        """
+        self._index = x
+        self._indexsig.value = x
+
+    def setFeedback(self, x):
+        """
+        Replace the `feedback` attribute.
+
+        :Args:
+
+            x : float or PyoObject
+                new `feedback` attribute.
+
+        """
+        self._feedback = x
+        self._feedbacksig.value = x
+
+    @property
+    def env(self):
+        """PolyMidiEnv. Envelopes of the voices."""
+        return self._env
+
+    @property
+    def policy(self):
+        """string. Voice stealing policy."""
+        return self._env.policy
+
+    @policy.setter
+    def policy(self, x): self.setPolicy(x)
+
+    @property
+    def ratio(self):
+        """float or PyoObject. Modulator frequency ratio."""
+        return self._ratio
+
+    @ratio.setter
+    def ratio(self, x): self.setRatio(x)
+
+    @property
+    def index(self):
+        """float or PyoObject. Modulation depth."""
+        return self._index
+
+    @index.setter
+    def index(self, x): self.setIndex(x)
+
+    @property
+    def feedback(self):
+        """float or PyoObject. Modulator feedback."""
+        return self._feedback
+
+    @feedback.setter
+    def feedback(self, x): self.setFeedback(x)
+
+def operatorStack(n, freq=110, mode="sine"):
+    """Return the carrier of a stack of 'n' Operators in mode 'mode', each modulating the next,
+    the last modulator with feedback."""
+    op = Operator(freq=freq, feedback=0.2, mode=mode)
+    for ratio in range(n - 1, 0, -1):
+        op = Operator(freq=freq, pm=op, ratio=ratio + 1, env=0.5, mode=mode)
+    return op
+
+def benchmark(nvoices=50, dur=5):
+    """Compare the CPU time, over 'dur' seconds of offline processing, of 'nvoices' voices of:
+    1, 4 and 6 Operator stacks in "sine" and "wavetable" modes, 4 operator PMVoice stacks,
+    and a PolyPM playing 0, 10% and 100% of its voices."""
+    import time
+    s = Server(audio="manual").boot()
+    s.start()
+    nblocks = int(dur * s.getSamplingRate() / s.getBufferSize())
+    def cpu(name, voices):
+        t = time.time()
+        for i in range(nblocks):
+            s.process()
+        elapsed = time.time() - t
+        print("%s: %.1f%% CPU, %.3f%% per voice"%(name, 100 * elapsed / dur, 100 * elapsed / dur / nvoices))
+        for v in voices:
+            v.stop()
+    for n in (1, 4, 6):
+        for mode in ("sine", "wavetable"):
+            cpu("%d operators, %s"%(n, mode), [operatorStack(n, mode=mode) for i in range(nvoices)])
+    stack = PMAlgorithm([[0,1,0,0], [0,0,1,0], [0,0,0,1], [0,0,0,0]], [1,0,0,0], feedback=[0,0,0,0.2])
+    cpu("4 operators, PMVoice", [PMVoice(110, stack, ratios=[1,2,3,4]) for i in range(nvoices)])
+    ad, rel = LinTable([(0,0), (100,1), (8192,0.7)]), LinTable([(0,1), (8192,0)])
+    for mode in ("sine", "wavetable"):
+        poly = PolyPM(ad, rel, voices=nvoices, ratio=2, index=0.5, reldur=0.05, mode=mode)
+        for notes in (0, nvoices // 10, nvoices):
+            for pitch in range(notes):
+                poly.noteon(40 + pitch)
+            cpu("PolyPM %s, %d notes"%(mode, notes), [])
+        for pitch in range(nvoices):
+            poly.noteoff(40 + pitch)
+        while poly.getActiveVoices():
+            s.process()
+    s.shutdown()
+
+if __name__ == '__main__':
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+        sys.exit()
+    s = Server().boot()
+    alg = PMAlgorithm([[0,1,0,0], [0,0,0,0], [0,0,0,1], [0,0,0,0]], [1,0,1,0], feedback=[0,0,0,0.3])
+    v = PMVoice(220, alg, ratios=[1,2,1,3.5], env=[0.5,1,0.5,0.8]).out()
+    s.gui(locals())
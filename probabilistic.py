@@ -2,7 +2,13 @@ from __future__ import print_function
 
 from pyo import *
 
+import numpy
 import numpy.random as np
+import threading
+import bisect
+import time
+import weakref
+from collections import deque
 
 def ff():
     global value
@@ -18,35 +24,298 @@ def ff():
             break
     print(value)
 
+def aliasTable(probabilities):
+    """Build the Walker alias table of a discrete distribution(Vose's method).
+    Return a (prob, alias) pair of arrays: to draw, pick a column i uniformly,
+    then keep i with probability prob[i], else take alias[i]."""
+    p = numpy.asarray(probabilities, dtype=float)
+    n = len(p)
+    scaled = p * (n / p.sum())
+    prob = numpy.ones(n)
+    alias = numpy.arange(n)
+    small = [i for i in range(n) if scaled[i] < 1]
+    large = [i for i in range(n) if scaled[i] >= 1]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] = scaled[l] + scaled[s] - 1
+        if scaled[l] < 1:
+            small.append(l)
+        else:
+            large.append(l)
+    return prob, alias
+
+class AliasSampler(object):
+    """Draw values from a discrete distribution in constant time per draw,
+    using a precomputed alias table. Values returned by 'next' are taken from
+    a block of 'blocksize' draws, generated in one vectorized call when exhausted.
+
+    choices : sequence of numbers, the possible values.
+
+    probabilities : sequence of floats, probability of each choice, summing to 1.
+
+    rng : numpy.random.RandomState, optional. Random generator to draw from,
+    defaults to the global numpy generator."""
+    def __init__(self, choices, probabilities, blocksize=1024, rng=None):
+        choices = tuple(choices) if isinstance(choices, (list, tuple)) else (choices,)
+        probabilities = tuple(probabilities) if isinstance(probabilities, (list, tuple)) else (probabilities,)
+        if len(choices) != len(probabilities):
+            raise Exception("Got %d choices for %d probabilities"%(len(choices), len(probabilities)))
+        assert abs(sum(probabilities) - 1) < 1e-6, "Sum of probabilities not equal to 1.0"
+        self._choices = numpy.asarray(choices, dtype=float)
+        self._prob, self._alias = aliasTable(probabilities)
+        self._rng = rng if rng is not None else np
+        self._blocksize = blocksize
+        self._block = []
+        self._pos = 0
+
+    def draw(self, size):
+        """Return an array of 'size' random values."""
+        column = self._rng.randint(0, len(self._prob), size)
+        pick = numpy.where(self._rng.random_sample(size) < self._prob[column], column, self._alias[column])
+        return self._choices[pick]
+
+    def next(self):
+        """Return the next random value."""
+        if self._pos >= len(self._block):
+            self._block = self.draw(self._blocksize).tolist()
+            self._pos = 0
+        value = self._block[self._pos]
+        self._pos += 1
+        return value
+
+class MultiAliasSampler(object):
+    """Alias tables of one distribution per channel, padded into matrices,
+    so that values for any set of channels are drawn in one vectorized call.
+
+    choices : list of sequences of numbers, the possible values of each channel.
+
+    probabilities : list of sequences of floats, probabilities of each channel's choices.
+
+    rng : numpy.random.RandomState, optional. Random generator to draw from,
+    defaults to the global numpy generator."""
+    def __init__(self, choices, probabilities, rng=None):
+        samplers = [AliasSampler(c, p) for (c, p) in zip(choices, probabilities)]
+        width = max(len(s._prob) for s in samplers)
+        self._rng = rng if rng is not None else np
+        self._sizes = numpy.array([len(s._prob) for s in samplers])
+        self._prob = numpy.ones((len(samplers), width))
+        self._alias = numpy.zeros((len(samplers), width), dtype=int)
+        self._choices = numpy.zeros((len(samplers), width))
+        for i, s in enumerate(samplers):
+            self._prob[i, :self._sizes[i]] = s._prob
+            self._alias[i, :self._sizes[i]] = s._alias
+            self._choices[i, :self._sizes[i]] = s._choices
+
+    def draw(self, channels):
+        """Return an array with one random value for each channel index in the array 'channels'."""
+        u = self._rng.random_sample((2, len(channels)))
+        column = (u[0] * self._sizes[channels]).astype(int)
+        pick = numpy.where(u[1] < self._prob[channels, column], column, self._alias[channels, column])
+        return self._choices[channels, pick]
+
+def _refillLoop(poolref):
+    """Body of the refill thread of a SamplePool, exits when the pool is closed or collected."""
+    while True:
+        pool = poolref()
+        if pool is None or pool._closed:
+            return
+        wakeup = pool._wakeup
+        del pool
+        if not wakeup.wait(1.0):
+            continue
+        pool = poolref()
+        if pool is None:
+            return
+        wakeup.clear()
+        pool._pending = False
+        pool._refillAll()
+        del pool
+
+class SamplePool(object):
+    """Per-channel buffers of values drawn in advance from AliasSamplers.
+    Popping a value never calls numpy: buffers running low are topped up
+    by a background thread, in batches of 'batchsize' draws. If a buffer is
+    empty anyway(underrun), a batch is drawn synchronously.
+    Batches always have the same size and are drawn in order for each channel,
+    so a seeded sampler gives the same sequence whatever the thread timing.
+    Samplers given to 'setSamplers' must have freshly seeded generators for this to hold
+    after the swap, since the values already drawn are dropped.
+
+    samplers : list of AliasSampler, one per channel. They can be replaced with 'setSamplers',
+    the buffers being then refilled by the thread.
+
+    batchsize : int, number of draws per refill.
+
+    batches : int, number of batches each buffer holds when full."""
+    def __init__(self, samplers, batchsize=1024, batches=4):
+        self._samplers = list(samplers)
+        self._batchsize = batchsize
+        self._capacity = batchsize * batches
+        self._lowwater = self._capacity - batchsize
+        self._buffers = [deque() for s in self._samplers]
+        self._locks = [threading.Lock() for s in self._samplers]
+        self._closed = False
+        self._requested = None
+        self._pending = False # a refill was requested and not started yet
+        self._wakeup = threading.Event()
+        self.underruns = 0
+        self.refills = 0
+        self.latency = 0.
+        self.maxlatency = 0.
+        for i in range(len(self._samplers)):
+            while len(self._buffers[i]) < self._capacity:
+                self._refill(i)
+        self._thread = threading.Thread(target=_refillLoop, args=(weakref.ref(self),))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _refill(self, i):
+        with self._locks[i]:
+            if not self._closed:
+                self._buffers[i].extend(self._samplers[i].draw(self._batchsize).tolist())
+                self.refills += 1
+
+    def _refillAll(self):
+        requested = self._requested
+        for i in range(len(self._buffers)):
+            while not self._closed and len(self._buffers[i]) <= self._lowwater:
+                self._refill(i)
+        if requested is not None:
+            self.latency = time.time() - requested
+            self.maxlatency = max(self.maxlatency, self.latency)
+
+    def pop(self, i):
+        """Return the next value of channel 'i'."""
+        buf = self._buffers[i]
+        try:
+            value = buf.popleft()
+        except IndexError:
+            self.underruns += 1
+            self._refill(i)
+            value = buf.popleft()
+        if len(buf) < self._lowwater and not self._pending:
+            self._pending = True
+            self._requested = time.time()
+            self._wakeup.set()
+        return value
+
+    def setSamplers(self, samplers):
+        """Replace the sampler of each channel(same number of channels), dropping the values
+        drawn from the previous ones. The buffers are refilled by the thread, a channel popped
+        before draws its first batch synchronously."""
+        samplers = list(samplers)
+        if len(samplers) != len(self._samplers):
+            raise Exception("Got %d samplers for a pool of %d channels"%(len(samplers), len(self._samplers)))
+        for i, sampler in enumerate(samplers):
+            with self._locks[i]:
+                self._samplers[i] = sampler
+                self._buffers[i].clear()
+        self._pending = True
+        self._requested = time.time()
+        self._wakeup.set()
+
+    def close(self):
+        """Stop the refill thread. Waits for a refill in progress to end."""
+        for lock in self._locks:
+            lock.acquire()
+        self._closed = True
+        for lock in self._locks:
+            lock.release()
+        self._wakeup.set()
+
+    def getStats(self):
+        """Return a dictionary with the number of 'refills' and 'underruns', and the
+        'latency' and 'maxlatency'(in seconds) between a refill request and its completion."""
+        return {"refills": self.refills, "underruns": self.underruns,
+                "latency": self.latency, "maxlatency": self.maxlatency}
+
 class TrigProb(PyoObject):
-    def __init__(self, input, choices, probabilities, mul=1, add=0):        
+    """
+    Output a random value, chosen from a discrete distribution, on each trigger.
+
+    The alias table of the distribution is computed when the choices or probabilities
+    change, and values are drawn in advance by a background thread(see SamplePool),
+    so that a trigger only pops the next value of a buffer. Each change reseeds the
+    generators of a seeded TrigProb, from the seed and the number of changes so far,
+    so that its sequences do not depend on how far the thread had drawn.
+
+    :Parent: :py:class:`PyoObject`
+
+    :Args:
+
+        input : PyoObject
+            Audio signal sending triggers.
+        choices : tuple of floats
+            Possible output values. A list of tuples gives one distribution per channel.
+        probabilities : tuple of floats
+            Probability of each choice, summing to 1.
+        seed : int, optional
+            Seed of the random generators, for reproducible sequences.
+            Defaults to None(unpredictable sequences).
+
+    """
+    def __init__(self, input, choices, probabilities, seed=None, mul=1, add=0):        
         PyoObject.__init__(self, mul, add)
         self._input = input
         self._choices = choices
         self._probabilities = probabilities
+        self._seed = seed
+        self._pool = None
+        self._generation = 0 # number of sampler changes since the seed was set
         self._in_fader = InputFader(input)
-        choices, probabilities, lmax = convertArgsToLists(choices, probabilities)
-        for p in probabilities:
-            assert sum(p) == 1, "Sum of probabilities not equal to 1.0"
-            
-        self._chooser = TrigFunc(self._in_fader, function=lambda (c, p):self._value.setValue(float(np.choice(c, p=p))),
-                                 arg=zip(choices, probabilities))
-        self._value = Sig(0)
+        in_fader, choices, probabilities, lmax = convertArgsToLists(self._in_fader, choices, probabilities)
+        self._value = Sig([0]*lmax, mul=mul, add=add)
+        self._value_objs = self._value.getBaseObjects()
+        self._setSamplers(self._choices, self._probabilities)
+        self._chooser = TrigFunc(self._in_fader, function=self._choose, arg=list(range(lmax)))
         self._base_objs = self._value.getBaseObjects()
 
+    def _setSamplers(self, choices, probabilities):
+        """Build the samplers of 'choices' and 'probabilities' and install them, raising before any change if they are invalid.
+        Each channel gets a new generator, seeded from the seed, the channel and the generation."""
+        choices, probabilities, lmax = convertArgsToLists(choices, probabilities)
+        generation = 0 if self._pool is None else self._generation + 1
+        samplers = [AliasSampler(wrap(choices, i), wrap(probabilities, i),
+                                 rng=numpy.random.RandomState(None if self._seed is None else [self._seed, i, generation]))
+                    for i in range(len(self._value_objs))]
+        if self._pool is None:
+            self._pool = SamplePool(samplers)
+        else:
+            self._pool.setSamplers(samplers)
+        self._generation = generation
+
+    def _choose(self, i):
+        self._value_objs[i].setValue(self._pool.pop(i))
+
+    def getStats(self):
+        """Return the refill and underrun statistics of the buffers of drawn values(see SamplePool.getStats)."""
+        return self._pool.getStats()
+
     def setInput(self, input, fadetime=0.05):
         self._input = input
         self._in_fader.setInput(input, fadetime)
 
     def setChoices(self, choices):
+        self._setSamplers(choices, self._probabilities)
         self._choices = choices
-        choices, probabilities, lmax = convertArgsToLists(choices, self._probabilities)
-        self._chooser.arg = zip(choices, probabilities)
 
     def setProbabilities(self, probabilities):
+        self._setSamplers(self._choices, probabilities)
         self._probabilities = probabilities
-        choices, probabilities, lmax = convertArgsToLists(self._choices, probabilities)
-        self._chooser.arg = zip(choices, probabilities)
+
+    def setDistribution(self, choices, probabilities):
+        """Replace both the choices and their probabilities, e.g. to change their number."""
+        self._setSamplers(choices, probabilities)
+        self._choices = choices
+        self._probabilities = probabilities
+
+    def setSeed(self, seed):
+        """Replace the seed, restarting the sequences as if the object had just been created with it."""
+        self._seed = seed
+        self._generation = -1
+        self._setSamplers(self._choices, self._probabilities)
 
     @property
     def input(self):
@@ -69,14 +338,327 @@ class TrigProb(PyoObject):
     def probabilities(self, x):
         self.setProbabilities(x)
 
+    @property
+    def seed(self):
+        return self._seed
+    @seed.setter
+    def seed(self, x):
+        self.setSeed(x)
+
         
 
+class MultiTrigProb(PyoObject):
+    """
+    Multichannel version of TrigProb, for many channels sharing the same triggers or audio blocks.
+
+    Instead of one Python callback per triggered channel, the triggers received
+    during an audio block are gathered(one Counter per input stream), the values
+    of all the triggered channels are drawn with one vectorized numpy call, and
+    written at once in a table read by the output streams.
+
+    :Parent: :py:class:`PyoObject`
+
+    :Args:
+
+        input : PyoObject
+            Audio signal sending triggers. Channels wrap around the input streams.
+        choices : tuple of floats
+            Possible output values. A list of tuples gives one distribution per channel.
+        probabilities : tuple of floats
+            Probability of each choice, summing to 1.
+        seed : int, optional
+            Seed of the random generator, for reproducible sequences.
+            Defaults to None(unpredictable sequences).
+
+    """
+    def __init__(self, input, choices, probabilities, seed=None, mul=1, add=0):
+        PyoObject.__init__(self, mul, add)
+        self._input = input
+        self._choices = choices
+        self._probabilities = probabilities
+        self._seed = seed
+        self._in_fader = InputFader(input)
+        in_fader, choices, probabilities, lmax = convertArgsToLists(self._in_fader, choices, probabilities)
+        self._chnls = lmax
+        self._rng = numpy.random.RandomState(seed)
+        self._setSampler(self._choices, self._probabilities)
+        # objects are processed in creation order: counters before the callback, table reader after
+        self._counter = Counter(self._in_fader, min=1, max=2**24) # outputs 0 until the first trigger
+        self._last = numpy.zeros(len(self._counter))
+        self._trigmap = numpy.arange(lmax) % len(self._counter)
+        self._chooser = TrigFunc(Clip(Mix(self._in_fader, voices=1), min=0, max=1), function=self._choose)
+        self._current = numpy.zeros(lmax)
+        self._table = DataTable(size=lmax, init=[0.]*lmax)
+        self._out = TableIndex(self._table, Sig(list(range(lmax))), mul=mul, add=add)
+        self._base_objs = self._out.getBaseObjects()
+
+    def _setSampler(self, choices, probabilities):
+        """Build the sampler of 'choices' and 'probabilities' and install it, raising before any change if they are invalid."""
+        choices, probabilities, lmax = convertArgsToLists(choices, probabilities)
+        self._sampler = MultiAliasSampler([wrap(choices, i) for i in range(self._chnls)],
+                                          [wrap(probabilities, i) for i in range(self._chnls)], rng=self._rng)
+
+    def _choose(self):
+        counts = numpy.array(self._counter.get(all=True))
+        changed = counts != self._last
+        if not changed.any(): # other triggers of an already handled block
+            return
+        self._last = counts
+        channels = numpy.nonzero(changed[self._trigmap])[0]
+        self._current[channels] = self._sampler.draw(channels)
+        self._table.replace(self._current.tolist())
+
+    def setInput(self, input, fadetime=0.05):
+        self._input = input
+        self._in_fader.setInput(input, fadetime)
+
+    def setChoices(self, choices):
+        self._setSampler(choices, self._probabilities)
+        self._choices = choices
+
+    def setProbabilities(self, probabilities):
+        self._setSampler(self._choices, probabilities)
+        self._probabilities = probabilities
+
+    def setDistribution(self, choices, probabilities):
+        """Replace both the choices and their probabilities, e.g. to change their number."""
+        self._setSampler(choices, probabilities)
+        self._choices = choices
+        self._probabilities = probabilities
+
+    def setSeed(self, seed):
+        self._seed = seed
+        self._rng = numpy.random.RandomState(seed)
+        self._setSampler(self._choices, self._probabilities)
+
+    def out(self, chnl=0, inc=1, dur=0, delay=0):
+        return self.play(dur, delay)
+
+    @property
+    def input(self):
+        return self._input
+    @input.setter
+    def input(self, x):
+        self.setInput(x)
+
+    @property
+    def choices(self):
+        return self._choices
+    @choices.setter
+    def choices(self, x):
+        self.setChoices(x)
+
+    @property
+    def probabilities(self):
+        return self._probabilities
+    @probabilities.setter
+    def probabilities(self, x):
+        self.setProbabilities(x)
+
+    @property
+    def seed(self):
+        return self._seed
+    @seed.setter
+    def seed(self, x):
+        self.setSeed(x)
+
+def cumulativeRows(matrix):
+    """Validate a transition matrix(sequence of rows of probabilities, each summing to 1)
+    and return its cumulative rows, as lists of floats."""
+    matrix = numpy.asarray(matrix, dtype=float)
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise Exception("Transition matrix must be square, got shape %s"%(matrix.shape,))
+    assert numpy.allclose(matrix.sum(axis=1), 1, atol=1e-6), "Sum of probabilities not equal to 1.0 in every row"
+    return numpy.cumsum(matrix, axis=1).tolist()
+
+class TrigMarkov(PyoObject):
+    """
+    Markov chain driven by triggers.
+
+    Each trigger moves the chain to a new state, chosen with the probabilities
+    of the current state's row of the transition matrix, and outputs the value of that state.
+    Rows are stored cumulated, so that the next state is found by bisection of
+    a uniform draw, taken from a block of precomputed draws.
+    The matrix can be replaced at any time, without touching the output objects.
+
+    :Parent: :py:class:`PyoObject`
+
+    :Args:
+
+        input : PyoObject
+            Audio signal sending triggers. One chain runs per input stream.
+        states : tuple of floats
+            Output value of each state.
+        matrix : sequence of sequences of floats
+            Transition matrix. matrix[i][j] is the probability to go from state i to state j,
+            each row summing to 1.
+        init : int, optional
+            Index of the initial state. Defaults to 0.
+        seed : int, optional
+            Seed of the random generators, for reproducible sequences.
+            Defaults to None(unpredictable sequences).
+
+    """
+    def __init__(self, input, states, matrix, init=0, seed=None, mul=1, add=0):
+        PyoObject.__init__(self, mul, add)
+        self._input = input
+        self._states = states
+        self._matrix = matrix
+        self._init = init
+        self._seed = seed
+        self._in_fader = InputFader(input)
+        self._setTables(states, matrix)
+        lmax = len(self._in_fader)
+        self._current = [init]*lmax
+        self._value = Sig([self._tables[0][init]]*lmax, mul=mul, add=add)
+        self._value_objs = self._value.getBaseObjects()
+        self._setRNGs()
+        self._chooser = TrigFunc(self._in_fader, function=self._choose, arg=list(range(lmax)))
+        self._base_objs = self._value.getBaseObjects()
+
+    def _setTables(self, states, matrix):
+        values = list(states) if isinstance(states, (list, tuple)) else [states]
+        cumrows = cumulativeRows(matrix)
+        if len(values) != len(cumrows):
+            raise Exception("Got %d states for a %dx%d transition matrix"%(len(values), len(cumrows), len(cumrows)))
+        # replaced in one assignment, triggers may be handled on the audio thread at any time
+        self._tables = (values, cumrows)
+
+    def _clampStates(self):
+        """Send the chains whose state is beyond the current matrix back to state 0, in place."""
+        nstates = len(self._tables[1])
+        for i, state in enumerate(self._current):
+            if state >= nstates:
+                self._current[i] = 0
+
+    def _setRNGs(self):
+        self._rngs = [numpy.random.RandomState(None if self._seed is None else [self._seed, i])
+                      for i in range(len(self._value_objs))]
+        self._blocks = [[] for i in self._rngs]
+
+    def _choose(self, i):
+        block = self._blocks[i]
+        if not block:
+            block.extend(self._rngs[i].random_sample(1024).tolist())
+        values, cumrows = self._tables
+        state = self._current[i]
+        row = cumrows[state if state < len(cumrows) else 0] # the matrix may just have shrunk
+        state = min(bisect.bisect_right(row, block.pop()), len(row) - 1)
+        self._current[i] = state
+        self._value_objs[i].setValue(values[state])
+
+    def getCurrentState(self):
+        """Return the current state index of each chain."""
+        return list(self._current)
+
+    def setInput(self, input, fadetime=0.05):
+        self._input = input
+        self._in_fader.setInput(input, fadetime)
+
+    def setStates(self, states):
+        self._setTables(states, self._matrix)
+        self._states = states
+
+    def setMatrix(self, matrix):
+        """Replace the transition matrix. The chains keep their current state,
+        or go back to state 0 if the new matrix has less states."""
+        values = list(self._states) if isinstance(self._states, (list, tuple)) else [self._states]
+        if len(values) != len(matrix):
+            raise Exception("Got %d states for a %dx%d transition matrix"%(len(values), len(matrix), len(matrix)))
+        self._setTables(values, matrix)
+        self._matrix = matrix
+        self._clampStates()
+
+    def setTransition(self, states, matrix):
+        """Replace both the states and the transition matrix, e.g. to change their size."""
+        self._setTables(states, matrix)
+        self._states = states
+        self._matrix = matrix
+        self._clampStates()
+
+    def setSeed(self, seed):
+        self._seed = seed
+        self._setRNGs()
+
+    def out(self, chnl=0, inc=1, dur=0, delay=0):
+        return self.play(dur, delay)
+
+    @property
+    def input(self):
+        return self._input
+    @input.setter
+    def input(self, x):
+        self.setInput(x)
+
+    @property
+    def states(self):
+        return self._states
+    @states.setter
+    def states(self, x):
+        self.setStates(x)
+
+    @property
+    def matrix(self):
+        return self._matrix
+    @matrix.setter
+    def matrix(self, x):
+        self.setMatrix(x)
+
+    @property
+    def seed(self):
+        return self._seed
+    @seed.setter
+    def seed(self, x):
+        self.setSeed(x)
+
+def benchmark(ntriggers=10000, nchannels=64):
+    """Compare the per-trigger cost of numpy.random.choice with AliasSampler.next, SamplePool.pop
+    and MultiAliasSampler.draw(all channels at once), for 'ntriggers' triggers on each of 'nchannels' channels:
+    mean time per trigger, and time of the rounds of one trigger per channel(e.g. one audio block):
+    AliasSampler draws its blocks in some rounds, SamplePool only pops(its slowest rounds are
+    those interrupted by the refill thread, when it runs on the same core)."""
+    choices = (35, 36, 45, 46, 56)
+    probabilities = (.1, .2, .3, .2, .2)
+    def run(trigger):
+        rounds = []
+        t = time.time()
+        for i in range(ntriggers):
+            start = time.time()
+            for c in range(nchannels):
+                trigger(c)
+            rounds.append(time.time() - start)
+        rounds.sort()
+        return (time.time() - t) / (ntriggers * nchannels), rounds[int(len(rounds) * .999)], rounds[-1]
+    samplers = [AliasSampler(choices, probabilities) for i in range(nchannels)]
+    results = [("numpy.random.choice", run(lambda c: float(np.choice(choices, p=probabilities)))),
+               ("AliasSampler", run(lambda c: samplers[c].next()))]
+    pool = SamplePool([AliasSampler(choices, probabilities) for i in range(nchannels)])
+    time.sleep(.1)
+    results.append(("SamplePool", run(pool.pop)))
+    stats = pool.getStats()
+    pool.close()
+    for name, (mean, slow, worst) in results:
+        print("%s: %.2f us/trigger, rounds of %d triggers: 99.9%% under %.1f us, slowest %.1f us"%(
+            name, mean * 1e6, nchannels, slow * 1e6, worst * 1e6))
+    print("SamplePool stats: %s"%(stats,))
+    sampler = MultiAliasSampler([choices]*nchannels, [probabilities]*nchannels)
+    channels = numpy.arange(nchannels)
+    t = time.time()
+    for i in range(ntriggers):
+        sampler.draw(channels)
+    elapsed = (time.time() - t) / (ntriggers * nchannels)
+    print("MultiAliasSampler(all channels per call): %.2f us/trigger"%(elapsed * 1e6))
+
 if __name__ == '__main__':
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+        sys.exit()
     s = Server().boot()
     s.amp = 0.1
     s.verbosity = 0
     m = Metro(time=1).play()
-    a = TrigProb(m, choice=(35,36,45,46, 56), probabilities=(.1,.2,.3,.2,.2))
+    a = TrigProb(m, choices=(35,36,45,46, 56), probabilities=(.1,.2,.3,.2,.2))
     b = SineLoop(freq=MToF(a), feedback=.25)
     mix = b.mix(2).out()
     s.gui(locals())
@@ -1,17 +1,43 @@
 #!/usr/bin/env python
 # encoding: utf-8
 from pyo import *
-
-class Pulse(Pulsar):
+from tablecache import *
+import math
+import weakref
+
+def _saw(n):
+    """Harmonics of the saw frac(x) - 0.5."""
+    return 1j / (math.pi * n)
+
+def _parabola(n):
+    """Harmonics of the parabola frac(x)**2 - frac(x) + 1/6, whose slope is twice the saw."""
+    return 1. / (math.pi * n)**2 + 0j
+
+# Piecewise linear waveforms of duty d, as a constant(times d) plus saws and parabolas
+# delayed by a fraction of d: each jump J gives a saw of amplitude -J and each slope change K
+# a parabola of amplitude -K/2. Terms are (waveform, delay, amplitude, divided by d).
+_SHAPES = {
+    0: (1, [(_saw, 0, -1, False), (_saw, 1, 1, False)]),
+    1: (.5, [(_parabola, 0, -1, True), (_parabola, .5, 2, True), (_parabola, 1, -1, True)]),
+    2: (.5, [(_saw, 1, 1, False), (_parabola, 0, -.5, True), (_parabola, 1, .5, True)]),
+    3: (.5, [(_saw, 0, -1, False), (_parabola, 0, .5, True), (_parabola, 1, -.5, True)]),
+}
+
+class Pulse(PyoObject):
     """ Pulse waveforms, with variable pulse width(duty) and multiple possible waveforms.
 
+    The pulse, triangle and saw waveforms are band-limited: they are sums of saws and parabolas
+    read from tables shared by every instance, one per octave(see tablecache.mipmapTables),
+    the table being picked from the current frequency. The sine waveform, having no jump or corner,
+    is played by a Pulsar.
+
     :Parent: :py:class:`PyoObject`
 
     :Args:
 
         freq : float or PyoObject, optional
-            Oscillator frequency in cycles per second. The frequency is
-            internally clamped between 0.00001 and sr/4. Defaults to 100.
+            Oscillator frequency in cycles per second. When it is a PyoObject,
+            the octave of the tables is updated every 50 ms. Defaults to 440.
         phase : float or PyoObject, optional
             Phase of sampling, expressed as a fraction of a cycle (0 to 1).
             Defaults to 0.
@@ -29,43 +55,196 @@ class Pulse(Pulsar):
     .. seealso::
 
         :py:class:`Pulsar`, :py:class:`PWM`
+
+    .. note::
+
+        Waveforms rebuilt by setType reach the output one buffer late.
+
     """
     
     def __init__(self, freq=440, phase=0, duty=0.5, type=0, mul=1,add=0):
+        PyoObject.__init__(self, mul, add)
+        self._freq = freq
+        self._phase = phase
         self._duty = duty
         self._type = type
-        self._types = {
-            0: lambda:  LinTable([(0,1),(8192,1)]),
-            1: lambda:  LinTable([(0,0), (4096, 1), (8192,0)]),
-            2: lambda:  LinTable([(0,0),(8192,1)]),
-            3: lambda:  LinTable([(0,1),(8192,0)]),
-            4: lambda:  CosTable([(0,0), (4096, 1), (8192,0)])
-        }
-
-        type, lmax = convertArgsToLists(type)
-        Pulsar.__init__(self, table=[self._types[wrap(type, i)]() for i in range(lmax)],
-                        env=LinTable([(0,1),(8192,1)]), freq=freq, phase=phase, frac=self._duty,mul=mul,add=add)
+        freq, phase, duty, type, mul, add, lmax = convertArgsToLists(freq, phase, duty, type, mul, add)
+        self._freq_sigs = [Sig(wrap(freq, i)) for i in range(lmax)]
+        self._phase_sigs = [Sig(wrap(phase, i)) for i in range(lmax)]
+        self._duty_sigs = [Sig(wrap(duty, i)) for i in range(lmax)]
+        self._duty_clips = [Clip(sig, 0.001, 1) for sig in self._duty_sigs] # duty for the terms divided by it
+        self._inverses = [1. / clip for clip in self._duty_clips]
+        self._streams = [self._build(i, wrap(type, i)) for i in range(lmax)]
+        # built after the streams, so that they read them in the same buffer
+        self._outputs = [Sig(self._streams[i]["output"], mul=wrap(mul, i), add=wrap(add, i)) for i in range(lmax)]
+        ref = weakref.ref(self)
+        self._selector = Pattern(lambda: ref() is not None and ref()._selectTables(), time=.05)
+        self._base_objs = sum([out.getBaseObjects() for out in self._outputs], [])
+        self.setFreq(self._freq)
+
+    def _build(self, i, type):
+        """Build the waveform 'type' of stream 'i', returns its objects and oscillators."""
+        freq, phase, duty = self._freq_sigs[i], self._phase_sigs[i], self._duty_sigs[i]
+        if type == 4:
+            pulsar = Pulsar(table=cachedTable(CosTable, [(0,0), (4096, 1), (8192,0)]), env=cachedTable(LinTable, [(0,1),(8192,1)]),
+                            freq=freq, phase=phase, frac=duty)
+            return {"objs": [pulsar], "oscs": [], "output": pulsar}
+        const, terms = _SHAPES[type]
+        objs, oscs = [], []
+        for harmonics, delay, amp, inverse in terms:
+            if delay:
+                objs.append(Wrap(phase - self._duty_clips[i] * delay))
+            osc = Osc(mipmapTables(harmonics)[0], freq=freq, phase=objs[-1] if delay else phase,
+                      mul=self._inverses[i] * amp if inverse else amp)
+            objs.append(osc)
+            oscs.append((osc, harmonics))
+        output = sum([osc for osc, harmonics in oscs], self._duty_clips[i] * const)
+        return {"objs": objs, "oscs": oscs, "output": output}
+
+    def _internals(self):
+        objs = self._freq_sigs + self._phase_sigs + self._duty_sigs + self._duty_clips + self._inverses
+        for stream in self._streams:
+            objs += stream["objs"] + [stream["output"]]
+        return objs
+
+    def _followsFreq(self):
+        """Whether the frequency is a signal, whose octave the selector follows."""
+        return any(isinstance(f, PyoObject) for f in (self._freq if isinstance(self._freq, list) else [self._freq]))
+
+    def _selectTables(self):
+        """Read each stream's tables from the octave of its current frequency."""
+        sr = self.getSamplingRate()
+        freqs = self._freq.get(all=True) if isinstance(self._freq, PyoObject) else self._freq
+        for i, stream in enumerate(self._streams):
+            freq = wrap(freqs, i) if isinstance(freqs, list) else freqs
+            freq = freq.get() if isinstance(freq, PyoObject) else freq
+            index = mipmapIndex(freq, sr)
+            for osc, harmonics in stream["oscs"]:
+                table = mipmapTables(harmonics)[index]
+                if osc.table is not table:
+                    osc.table = table
+
+    def setFreq(self, x):
+        """
+        Replace the `freq` attribute.
+
+        :Args:
+
+            x : float or PyoObject
+                new `freq` attribute.
+
+        """
+        self._freq = x
+        for i, sig in enumerate(self._freq_sigs):
+            sig.value = wrap(x, i) if isinstance(x, list) else x
+        self._selectTables()
+        if self._followsFreq() and self.isPlaying():
+            self._selector.play()
+        else:
+            self._selector.stop()
+
+    def setPhase(self, x):
+        """
+        Replace the `phase` attribute.
+
+        :Args:
+
+            x : float or PyoObject
+                new `phase` attribute.
+
+        """
+        self._phase = x
+        for i, sig in enumerate(self._phase_sigs):
+            sig.value = wrap(x, i) if isinstance(x, list) else x
+
+    def setDuty(self, x):
+        """
+        Replace the `duty` attribute.
+
+        :Args:
+
+            x : float or PyoObject
+                new `duty` attribute.
+
+        """
+        self._duty = x
+        for i, sig in enumerate(self._duty_sigs):
+            sig.value = wrap(x, i) if isinstance(x, list) else x
 
     def setType(self, type):
+        """
+        Replace the `type` attribute, rebuilding the waveforms.
+
+        :Args:
+
+            x : int
+                new `type` attribute.
+
+        """
         self._type= type
-        type, lmax = convertArgsToLists(type)
-        self.setTable([self._types[wrap(type, i)]() for i in range(lmax)])
+        for i, output in enumerate(self._outputs):
+            playing = output.isPlaying()
+            self._streams[i] = self._build(i, wrap(type, i) if isinstance(type, list) else type)
+            output.value = self._streams[i]["output"]
+            if not playing:
+                for obj in self._streams[i]["objs"] + [self._streams[i]["output"]]:
+                    obj.stop()
+        self._selectTables()
+
+    def play(self, dur=0, delay=0):
+        for obj in self._internals():
+            obj.play(dur, delay)
+        if self._followsFreq():
+            self._selector.play(dur, delay)
+        return PyoObject.play(self, dur, delay)
+
+    def stop(self):
+        for obj in self._internals():
+            obj.stop()
+        self._selector.stop()
+        return PyoObject.stop(self)
+
+    def out(self, chnl=0, inc=1, dur=0, delay=0):
+        for obj in self._internals():
+            obj.play(dur, delay)
+        if self._followsFreq():
+            self._selector.play(dur, delay)
+        return PyoObject.out(self, chnl, inc, dur, delay)
 
     @property
     def type(self):
+        """int. Waveform type."""
         return self._type
 
     @type.setter
     def type(self, x):
         self.setType(x)
-        
+
+    @property
+    def freq(self):
+        """float or PyoObject. Frequency."""
+        return self._freq
+
+    @freq.setter
+    def freq(self, x):
+        self.setFreq(x)
+
+    @property
+    def phase(self):
+        """float or PyoObject. Phase of sampling."""
+        return self._phase
+
+    @phase.setter
+    def phase(self, x):
+        self.setPhase(x)
+
     @property
     def duty(self):
         """float or PyoObject. Duty cycle of the pulse waveform(pulse width)."""
-        return self._frac
+        return self._duty
     @duty.setter
     def duty(self, x):
-        self.setFrac(x)
+        self.setDuty(x)
 
     def ctrl(self, map_list=None, title=None, wxnoserver=False):
         self._map_list = [SLMapFreq(self._freq),
@@ -96,11 +275,16 @@ class PWM(Pulse):
     def __init__(self, freq=440, type=0, ratio=1, index=1, mul=1, add=0):
         self._ratio = ratio
         self._index = index
-        freq, ratio, index, lmax = convertArgsToLists(freq, ratio, index)
-        self._mod = Sine(freq=Sig(freq, mul=ratio),
-                         mul=Sig(0.5, mul=index), add=.5)
+        # parameters are persistent signals, whose values the setters replace
+        self._freq_sig = Sig(freq)
+        self._ratio_sig = Sig(ratio)
+        self._index_sig = Sig(index)
+        self._mod = Sine(freq=Sig(self._freq_sig, mul=self._ratio_sig),
+                         mul=Sig(self._index_sig, mul=0.5), add=.5)
         Pulse.__init__(self, freq=freq, type=type, duty=self._mod, mul=mul, add=add)
 
+    def _internals(self):
+        return [self._freq_sig, self._ratio_sig, self._index_sig, self._mod.freq, self._mod.mul, self._mod] + Pulse._internals(self)
 
     def setRatio(self, ratio):
         """
@@ -112,10 +296,8 @@ class PWM(Pulse):
                 new `ratio` attribute.
 
         """
-
         self._ratio = ratio
-        freq, ratio, lmax = convertArgsToLists(self._freq, ratio)
-        self._mod.freq = [Sig(wrap(ratio, i))*wrap(freq, i) for i in range(lmax)]
+        self._ratio_sig.value = ratio
 
     def setIndex(self, index):
         """
@@ -128,12 +310,11 @@ class PWM(Pulse):
 
         """
         self._index = index
-        index, lmax = convertArgsToLists(index)
-        self._mod.mul = [Sig(wrap(index, i))*0.5 for i in range(lmax)]
+        self._index_sig.value = index
 
     def setFreq(self, freq):
         """
-        Replace the `freq` attribute.
+        Replace the `freq` attribute, of the carrier and the modulator.
 
         :Args:
 
@@ -141,9 +322,8 @@ class PWM(Pulse):
                 new `freq` attribute.
 
         """
-        self._freq = freq
-        freq, ratio, index, lmax = convertArgsToLists(freq, self._ratio, self._index)
-        self._mod.freq = [Sig(wrap(freq, i))*wrap(ratio, i) for i in range(lmax)]
+        self._freq_sig.value = freq
+        Pulse.setFreq(self, freq)
 
     @property
     def ratio(self):
@@ -181,3 +361,53 @@ class PWM(Pulse):
         PyoObject.ctrl(self, map_list, title, wxnoserver)
 
 
+
+def benchmark(updates=10000, dur=10, n=10, buffersize=256):
+    """Run 'n' PWM for 'dur' seconds with 'updates' parameter changes per second(freq, ratio and index in turn),
+    with the persistent parameter signals and with fresh Sig graphs for each change(as the setters used to),
+    printing the time per second of audio, the slowest buffer and the growth of the number of python objects."""
+    import gc
+    import random
+    import time
+    s = Server(audio="manual", buffersize=buffersize).boot()
+    s.start()
+    sr = s.getSamplingRate()
+    def fresh(obj, name, value):
+        if name == "freq":
+            obj._mod.freq = Sig(value) * obj._ratio
+        elif name == "ratio":
+            obj._mod.freq = Sig(value) * obj._freq
+        else:
+            obj._mod.mul = Sig(value) * 0.5
+    def persistent(obj, name, value):
+        setattr(obj, name, value)
+    ranges = {"freq": (50, 2000), "ratio": (0.01, 2), "index": (0, 1)}
+    for label, update in (("persistent signals", persistent), ("fresh Sig graphs", fresh)):
+        objs = [PWM(freq=100 + i) for i in range(n)]
+        blocks = int(dur * sr / buffersize)
+        perblock = updates * buffersize / sr
+        count, done = 0., 0
+        gc.collect()
+        nobjs = len(gc.get_objects())
+        worst = 0
+        t = time.time()
+        for b in range(blocks):
+            start = time.time()
+            count += perblock
+            while count >= 1:
+                count -= 1
+                done += 1
+                name = ("freq", "ratio", "index")[done % 3]
+                update(random.choice(objs), name, random.uniform(*ranges[name]))
+            s.process()
+            worst = max(worst, time.time() - start)
+        elapsed = time.time() - t
+        print("%s: %d updates/s on %d PWM, %.3fs per second of audio, slowest buffer %.2fms(%.2fms of audio), %+d python objects"%(
+            label, updates, n, elapsed / dur, worst * 1000, buffersize * 1000. / sr, len(gc.get_objects()) - nobjs))
+        for obj in objs:
+            obj.stop()
+        del objs
+    s.shutdown()
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,227 @@
+from __future__ import print_function
+
+from pyo import *
+from flanger import *
+from autowah import *
+from ringmod import *
+from pwm import *
+import json
+import multiprocessing
+import os
+import time
+
+# chain units by name. Effects take the signal as input, generators(no input) multiply it.
+UNITS = {
+    "flanger": (Flanger, True),
+    "autowah": (Autowah, True),
+    "ringmod": (RingMod, True),
+    "pwm": (PWM, False),
+    "pulse": (Pulse, False),
+}
+
+# pyo recordOptions file formats, by file extension
+FORMATS = {".wav": 0, ".aif": 1, ".aiff": 1, ".au": 2, ".raw": 3, ".sd2": 4, ".flac": 5, ".caf": 6, ".ogg": 7}
+
+def loadChain(path):
+    """Load a chain description from the JSON file 'path'(see buildChain)."""
+    with open(path) as f:
+        return json.load(f)
+
+def buildChain(source, chain):
+    """Build the units of 'chain' after 'source', returns the list of built units(the last one is the output).
+
+    source : PyoObject, signal to process.
+
+    chain : list of dicts, each with a "unit" key naming one of UNITS, the other keys being its arguments,
+            e.g. [{"unit": "flanger", "freq": 0.2}, {"unit": "ringmod", "freq": 300}]."""
+    units = []
+    for stage in chain:
+        args = dict((str(k), v) for k, v in stage.items() if k != "unit")
+        if stage.get("unit") not in UNITS:
+            raise Exception("Unknown chain unit '%s', must be one of %s"%(stage.get("unit"), sorted(UNITS)))
+        cls, effect = UNITS[stage["unit"]]
+        if effect:
+            units.append(cls(source, **args))
+        else:
+            args["mul"] = source if "mul" not in args else source*args["mul"]
+            units.append(cls(**args))
+        source = units[-1]
+    return units
+
+def outputPath(infile, outdir):
+    """Return the path of the rendering of 'infile' in 'outdir'."""
+    return os.path.join(outdir, os.path.basename(infile))
+
+def outputPaths(infiles, outdir):
+    """Return the paths of the renderings of 'infiles' in 'outdir',
+    raising an exception if two of them would be written to the same file(e.g. a/x.wav and b/x.wav)."""
+    outfiles = [outputPath(infile, outdir) for infile in infiles]
+    seen = {}
+    for infile, outfile in zip(infiles, outfiles):
+        key = os.path.normcase(os.path.abspath(outfile))
+        if key in seen:
+            raise Exception("'%s' and '%s' would both be rendered to '%s'"%(seen[key], infile, outfile))
+        seen[key] = infile
+    return outfiles
+
+def render(chain, infiles, outdir, buffersize=256, tail=0, sampletype=0, progress=0, verbose=True):
+    """Render each file of 'infiles' through 'chain'(see buildChain) to a file of the same name in 'outdir',
+    with the server in offline mode, as fast as possible.
+    Returns a list with a dict per file: "file", "samples"(frames rendered), "time"(seconds)
+    and "rate"(samples per second).
+
+    buffersize : int, server buffer size.
+
+    tail : float, seconds rendered after the end of the input(e.g. for feedback).
+
+    sampletype : int, sample type of the output files(see Server.recordOptions).
+
+    progress : float, seconds of rendered audio between progress reports, 0 for none.
+
+    verbose : bool, print the progress and throughput of each file."""
+    outfiles = outputPaths(infiles, outdir)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    s = Server(buffersize=buffersize, duplex=0, audio="offline")
+    stats = []
+    for infile, outfile in zip(infiles, outfiles):
+        frames, dur, sr, chnls = sndinfo(infile, raise_on_failure=True)[:4]
+        s.setSamplingRate(sr)
+        s.setNchnls(chnls)
+        s.boot()
+        try:
+            s.recordOptions(dur=dur + tail, filename=outfile, sampletype=sampletype,
+                            fileformat=FORMATS.get(os.path.splitext(outfile)[1].lower(), 0))
+            units = buildChain(SfPlayer(infile), chain)
+            units[-1].out()
+            t = time.time()
+            if progress > 0 and verbose:
+                ticks = [0] # the metro triggers at the start, then every 'progress' seconds of audio
+                def report():
+                    rendered = ticks[0] * progress
+                    ticks[0] += 1
+                    if rendered > 0:
+                        print("%s: %.1fs/%.1fs, %d samples/s"%(infile, rendered, dur + tail, rendered * sr / max(time.time() - t, 1e-9)))
+                reporter = TrigFunc(Metro(time=progress).play(), report)
+            s.start() # returns when the file is rendered
+            elapsed = time.time() - t
+        finally:
+            s.shutdown()
+        samples = int(round((dur + tail) * sr))
+        stats.append({"file": outfile, "samples": samples, "time": elapsed, "rate": samples / max(elapsed, 1e-9)})
+        if verbose:
+            print("%s -> %s: %d samples in %.2fs, %d samples/s"%(infile, outfile, samples, elapsed, stats[-1]["rate"]))
+    if verbose and stats:
+        samples, elapsed = sum(st["samples"] for st in stats), sum(st["time"] for st in stats)
+        print("%d files, %d samples in %.2fs, %d samples/s"%(len(stats), samples, elapsed, samples / max(elapsed, 1e-9)))
+    return stats
+
+def _renderJob(args):
+    """Render one file in a worker process, returns its stats or the error message."""
+    chain, infile, outdir, buffersize, tail, sampletype = args
+    try:
+        return render(chain, [infile], outdir, buffersize=buffersize, tail=tail, sampletype=sampletype, verbose=False)[0]
+    except Exception as e:
+        return {"file": outputPath(infile, outdir), "error": "%s: %s"%(type(e).__name__, e)}
+
+def renderParallel(chain, infiles, outdir, workers=None, retries=1, timeout=None,
+                   buffersize=256, tail=0, sampletype=0, verbose=True):
+    """Render 'infiles' through 'chain' like render, split across a pool of 'workers' processes(default: one per core),
+    each running its own offline server. Returns the stats of the files in the order of 'infiles',
+    a failed file having an "error" key instead of the rendering stats.
+
+    retries : int, number of times a failed file is rendered again.
+
+    timeout : float, seconds after which a file is considered failed(e.g. its worker crashed), None to wait forever.
+    The pool is replaced before the files which timed out are retried, so that their first rendering
+    can not go on writing to the same output file."""
+    outputPaths(infiles, outdir)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    workers = workers or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(workers)
+    t = time.time()
+    results = [None]*len(infiles)
+    pending = list(range(len(infiles)))
+    try:
+        for attempt in range(retries + 1):
+            jobs = [(i, pool.apply_async(_renderJob, ((chain, infiles[i], outdir, buffersize, tail, sampletype),)))
+                    for i in pending]
+            pending = []
+            timedout = False
+            for i, job in jobs:
+                try:
+                    results[i] = job.get(timeout)
+                except multiprocessing.TimeoutError:
+                    timedout = True
+                    results[i] = {"file": outputPath(infiles[i], outdir), "error": "timed out after %ss"%(timeout,)}
+                if "error" in results[i]:
+                    pending.append(i)
+                    if verbose:
+                        print("%s failed(attempt %d): %s"%(infiles[i], attempt + 1, results[i]["error"]))
+            if not pending:
+                break
+            if timedout and attempt < retries: # kill the workers still rendering
+                pool.terminate()
+                pool.join()
+                pool = multiprocessing.Pool(workers)
+    finally:
+        pool.terminate()
+        pool.join()
+    elapsed = time.time() - t
+    if verbose:
+        samples = sum(st.get("samples", 0) for st in results)
+        print("%d files(%d failed) on %d workers, %d samples in %.2fs, %d samples/s"%(
+            len(results), len(pending), workers, samples, elapsed, samples / max(elapsed, 1e-9)))
+    return results
+
+def benchmark(nfiles=16, dur=10, workers=None):
+    """Render 'nfiles' noise files of 'dur' seconds through an autowah, flanger and ringmod chain,
+    with 1 to 'workers'(default: one per core) worker processes, and print the speedup."""
+    import shutil
+    import tempfile
+    tmp = tempfile.mkdtemp()
+    try:
+        s = Server(duplex=0, audio="offline")
+        infiles = [os.path.join(tmp, "stem%d.wav"%i) for i in range(nfiles)]
+        for path in infiles:
+            s.boot()
+            s.recordOptions(dur=dur, filename=path)
+            noise = Noise(0.3).out()
+            s.start()
+            s.shutdown()
+        del s
+        chain = [{"unit": "autowah"}, {"unit": "flanger", "feedback": 0.5}, {"unit": "ringmod", "freq": 300}]
+        base = None
+        for n in range(1, (workers or multiprocessing.cpu_count()) + 1):
+            t = time.time()
+            renderParallel(chain, infiles, os.path.join(tmp, "out"), workers=n, verbose=False)
+            elapsed = time.time() - t
+            base = base or elapsed
+            print("%d workers: %d files in %.2fs, speedup %.2f"%(n, nfiles, elapsed, base / elapsed))
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+        sys.exit()
+    import argparse
+    parser = argparse.ArgumentParser(description="Render sound files offline through a chain of PyoStuff units.")
+    parser.add_argument("chain", help="JSON chain description, a list of {\"unit\": name, argument: value...}")
+    parser.add_argument("outdir", help="directory of the rendered files")
+    parser.add_argument("infiles", nargs="+", help="sound files to render")
+    parser.add_argument("--buffersize", type=int, default=256)
+    parser.add_argument("--tail", type=float, default=0, help="seconds rendered after the end of each input")
+    parser.add_argument("--sampletype", type=int, default=0, help="see pyo Server.recordOptions")
+    parser.add_argument("--progress", type=float, default=0, help="seconds of audio between progress reports")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, 0 for one per core")
+    parser.add_argument("--retries", type=int, default=1, help="retries of a failed file, with --workers")
+    args = parser.parse_args()
+    if args.workers == 1:
+        render(loadChain(args.chain), args.infiles, args.outdir, buffersize=args.buffersize, tail=args.tail,
+               sampletype=args.sampletype, progress=args.progress)
+    else:
+        renderParallel(loadChain(args.chain), args.infiles, args.outdir, workers=args.workers or None,
+                       retries=args.retries, buffersize=args.buffersize, tail=args.tail, sampletype=args.sampletype)
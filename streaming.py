@@ -0,0 +1,244 @@
+from __future__ import print_function
+
+import numpy as np
+from numpyfx import *
+import os
+import struct
+import time
+
+##Streaming processing of wav files through a chain of effects, in fixed size chunks:
+##each chunk of the input is memory mapped, processed by the numpy versions of the effect units(numpyfx),
+##which keep their state from one chunk to the next, and appended to the output file.
+##Memory used depends on the chunk size, not on the length of the file.
+
+# chain units by name, as in render.py
+UNITS = {
+    "flanger": NumpyFlanger,
+    "autowah": NumpyAutowah,
+    "ringmod": NumpyRingMod,
+}
+
+# sample types: (wav format tag, bytes per sample, scale of full scale)
+SAMPLETYPES = {
+    "int16": (1, 2, 2.**15),
+    "int24": (1, 3, 2.**23),
+    "int32": (1, 4, 2.**31),
+    "float32": (3, 4, 1.),
+}
+
+# largest data chunk of a wav file, whose RIFF size(36 + data size) is an unsigned 32 bits int
+MAXDATASIZE = 0xFFFFFFFF - 36
+
+class WavReader(object):
+    """
+    Read a wav file(16, 24 or 32 bits integer, or 32 bits float) in chunks of 'chunksize' frames,
+    each chunk being memory mapped only while it is read.
+
+    :Args:
+
+        path : string
+            Path of the wav file.
+        chunksize : int, optional
+            Number of frames of the chunks. Defaults to 65536.
+
+    """
+    def __init__(self, path, chunksize=65536):
+        self.path = path
+        self.chunksize = chunksize
+        with open(path, "rb") as f:
+            riff, size, wave = struct.unpack("<4sI4s", f.read(12))
+            if riff != b"RIFF" or wave != b"WAVE":
+                raise Exception("'%s' is not a wav file"%(path,))
+            fmt = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise Exception("'%s' has no data chunk"%(path,))
+                name, size = struct.unpack("<4sI", header)
+                if name == b"fmt ":
+                    fmt = f.read(size)
+                    f.seek(size % 2, 1)
+                elif name == b"data":
+                    self._offset = f.tell()
+                    self._size = min(size, os.path.getsize(path) - self._offset)
+                    break
+                else:
+                    f.seek(size + size % 2, 1)
+        if fmt is None:
+            raise Exception("'%s' has no fmt chunk"%(path,))
+        tag, self.chnls, self.sr, rate, align, bits = struct.unpack("<HHIIHH", fmt[:16])
+        if tag == 0xFFFE: # WAVE_FORMAT_EXTENSIBLE, the format is the start of the subformat
+            tag = struct.unpack("<H", fmt[24:26])[0]
+        types = [name for name, (t, width, scale) in SAMPLETYPES.items() if t == tag and width * 8 == bits]
+        if not types:
+            raise Exception("'%s' has an unsupported sample format(tag %d, %d bits)"%(path, tag, bits))
+        self.sampletype = types[0]
+        self.frames = self._size // (self.chnls * bits // 8)
+
+    def read(self, start, frames):
+        """Return 'frames' frames from frame 'start', as a (frames, chnls) array of floats between -1 and 1."""
+        tag, width, scale = SAMPLETYPES[self.sampletype]
+        frames = max(0, min(frames, self.frames - start))
+        if frames == 0:
+            return np.zeros((0, self.chnls))
+        offset = self._offset + start * self.chnls * width
+        if self.sampletype == "int24":
+            data = np.memmap(self.path, dtype=np.uint8, mode="r", offset=offset, shape=(frames, self.chnls, 3))
+            ints = data[..., 0].astype(np.int32) | (data[..., 1].astype(np.int32) << 8) | (data[..., 2].astype(np.int32) << 16)
+            block = np.where(ints >= 1 << 23, ints - (1 << 24), ints) / scale
+        else:
+            dtype = {"int16": "<i2", "int32": "<i4", "float32": "<f4"}[self.sampletype]
+            data = np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=(frames, self.chnls))
+            block = data / scale
+        del data # unmap the chunk
+        return block
+
+    def __iter__(self):
+        """Iterate over the chunks of the file."""
+        for start in range(0, self.frames, self.chunksize):
+            yield self.read(start, self.chunksize)
+
+class WavWriter(object):
+    """
+    Write a wav file incrementally, the header being completed when the writer is closed.
+    Writing more than 4 GiB of data raises an exception, the wav header can not hold the size.
+
+    :Args:
+
+        path : string
+            Path of the wav file.
+        sr : int
+            Sampling rate.
+        chnls : int
+            Number of channels.
+        sampletype : string, optional
+            "int16", "int24", "int32" or "float32". Defaults to "int16".
+
+    """
+    def __init__(self, path, sr, chnls, sampletype="int16"):
+        if sampletype not in SAMPLETYPES:
+            raise Exception("Invalid sample type '%s', must be one of %s"%(sampletype, sorted(SAMPLETYPES)))
+        self.path = path
+        self.sr = sr
+        self.chnls = chnls
+        self.sampletype = sampletype
+        self.frames = 0
+        self._file = open(path, "wb")
+        self._writeHeader()
+
+    def _writeHeader(self):
+        tag, width, scale = SAMPLETYPES[self.sampletype]
+        size = self.frames * self.chnls * width
+        self._file.write(struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + size, b"WAVE", b"fmt ", 16, tag, self.chnls,
+                                     int(self.sr), int(self.sr) * self.chnls * width, self.chnls * width, width * 8,
+                                     b"data", size))
+
+    def write(self, block):
+        """Append the (frames, chnls) array 'block', of floats between -1 and 1."""
+        tag, width, scale = SAMPLETYPES[self.sampletype]
+        block = np.asarray(block).reshape(len(block), self.chnls)
+        if (self.frames + len(block)) * self.chnls * width > MAXDATASIZE:
+            raise Exception("'%s' would exceed the 4 GiB size limit of wav files, after %d frames"%(self.path, self.frames))
+        if tag == 3:
+            data = block.astype("<f4")
+        else:
+            ints = np.clip(np.round(block * scale), -scale, scale - 1).astype("<i4")
+            if width == 3:
+                data = ints.view(np.uint8).reshape(len(block), self.chnls, 4)[..., :3]
+            else:
+                data = ints.astype("<i%d"%(width,))
+        self._file.write(np.ascontiguousarray(data).tobytes())
+        self.frames += len(block)
+
+    def close(self):
+        """Complete the header and close the file."""
+        if not self._file.closed:
+            self._file.seek(0)
+            self._writeHeader()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def buildChain(chain, sr):
+    """Return the numpy effect units of 'chain', a list of dicts each with a "unit" key naming one of UNITS,
+    the other keys being its arguments(as in render.py)."""
+    units = []
+    for stage in chain:
+        if stage.get("unit") not in UNITS:
+            raise Exception("Unknown streaming unit '%s', must be one of %s"%(stage.get("unit"), sorted(UNITS)))
+        args = dict((str(k), v) for k, v in stage.items() if k != "unit")
+        units.append(UNITS[stage["unit"]](sr=sr, **args))
+    return units
+
+def processFile(chain, infile, outfile, chunksize=65536, tail=0, sampletype=None, verbose=True):
+    """Stream the wav file 'infile' through 'chain'(see buildChain) to the wav file 'outfile', 'chunksize' frames at a time.
+    Returns a dict with the number of "frames" written, the "time" it took and the "rate" in frames per second.
+
+    tail : float, seconds of silence processed after the end of the input(e.g. for feedback).
+
+    sampletype : string, sample type of the output(see WavWriter), defaults to the input's.
+
+    verbose : bool, print the throughput."""
+    reader = WavReader(infile, chunksize)
+    units = buildChain(chain, reader.sr)
+    t = time.time()
+    silence = int(round(tail * reader.sr))
+    with WavWriter(outfile, reader.sr, reader.chnls, sampletype or reader.sampletype) as writer:
+        for block in reader:
+            for unit in units:
+                block = unit.process(block)
+            writer.write(block)
+        for start in range(0, silence, chunksize):
+            block = np.zeros((min(chunksize, silence - start), reader.chnls))
+            for unit in units:
+                block = unit.process(block)
+            writer.write(block)
+        frames = writer.frames
+    elapsed = time.time() - t
+    stats = {"frames": frames, "time": elapsed, "rate": frames / max(elapsed, 1e-9)}
+    if verbose:
+        print("%s -> %s: %d frames in %.2fs, %d frames/s"%(infile, outfile, frames, elapsed, stats["rate"]))
+    return stats
+
+def benchmark(durs=(10, 60), chunksize=65536):
+    """Stream noise files of 'durs' seconds(shortest first) through a flanger, autowah and ringmod chain,
+    printing the maximum resident memory after each: it should not grow with the duration."""
+    import resource
+    import shutil
+    import tempfile
+    tmp = tempfile.mkdtemp()
+    chain = [{"unit": "flanger", "feedback": 0.5}, {"unit": "autowah"}, {"unit": "ringmod", "freq": 300}]
+    rng = np.random.RandomState(0)
+    try:
+        for dur in durs:
+            path = os.path.join(tmp, "in%d.wav"%(dur,))
+            with WavWriter(path, 44100, 2) as writer:
+                for start in range(0, dur * 44100, chunksize):
+                    writer.write(rng.uniform(-0.5, 0.5, (min(chunksize, dur * 44100 - start), 2)))
+            stats = processFile(chain, path, os.path.join(tmp, "out%d.wav"%(dur,)), chunksize=chunksize, verbose=False)
+            print("%ds: %d frames/s, max RSS %dkB"%(dur, stats["rate"], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+        sys.exit()
+    parser = argparse.ArgumentParser(description="Stream wav files through a chain of effects, in fixed size chunks.")
+    parser.add_argument("chain", help="JSON chain description, a list of {\"unit\": name, argument: value...}")
+    parser.add_argument("infile")
+    parser.add_argument("outfile")
+    parser.add_argument("--chunksize", type=int, default=65536, help="frames per chunk")
+    parser.add_argument("--tail", type=float, default=0, help="seconds processed after the end of the input")
+    parser.add_argument("--sampletype", choices=sorted(SAMPLETYPES), help="defaults to the input's")
+    args = parser.parse_args()
+    with open(args.chain) as f:
+        chain = json.load(f)
+    processFile(chain, args.infile, args.outfile, chunksize=args.chunksize, tail=args.tail, sampletype=args.sampletype)
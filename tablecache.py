@@ -0,0 +1,92 @@
+from __future__ import print_function
+
+from pyo import *
+import weakref
+
+_cache = weakref.WeakValueDictionary()
+
+def cachedTable(cls, points, size=8192):
+    """Return a table of class 'cls'(e.g. LinTable, CosTable) built from 'points',
+    shared by every caller asking for the same class, points and size.
+    Tables are kept as long as one of their users references them,
+    and must not be modified(e.g. with replace or put), since other objects read them too.
+
+    cls : PyoTableObject subclass taking a list of points(or of harmonics amplitudes, e.g. HarmTable) and a size.
+
+    points : list of (index, value) tuples, or of floats.
+
+    size : int, size of the table."""
+    key = (cls, tuple(tuple(p) if isinstance(p, (list, tuple)) else p for p in points), size)
+    table = _cache.get(key)
+    if table is None:
+        table = cls(list(points), size=size)
+        _cache[key] = table
+    return table
+
+_mipmaps = {}
+
+def mipmapTables(harmonics, size=8192):
+    """Return the band-limited versions of a periodic waveform, one table per octave,
+    built once per process(with numpy) and shared by every caller asking for the same 'harmonics' and size.
+    Table k holds the harmonics 1 to size/4 >> k, see mipmapIndex to pick the table of a frequency.
+    Like cachedTable's, these tables must not be modified.
+
+    harmonics : function taking a numpy array of harmonic numbers and returning their complex amplitudes,
+                b - 1j*a for the harmonic b*cos(2*pi*n*x) + a*sin(2*pi*n*x).
+
+    size : int, size of the tables, a power of 2."""
+    key = (harmonics, size)
+    if key not in _mipmaps:
+        import numpy as np
+        tables = []
+        nharms = size // 4
+        while nharms >= 1:
+            spectrum = np.zeros(size // 2 + 1, dtype=complex)
+            spectrum[1:nharms + 1] = harmonics(np.arange(1, nharms + 1)) * size / 2.
+            tables.append(DataTable(size, init=np.fft.irfft(spectrum, size).tolist()))
+            nharms //= 2
+        _mipmaps[key] = tables
+    return _mipmaps[key]
+
+def mipmapIndex(freq, sr, size=8192):
+    """Return the index of the mipmapTables table playing 'freq' without aliasing at the sampling rate 'sr':
+    the one with the most harmonics below the nyquist frequency."""
+    index = 0
+    nharms = size // 4
+    while nharms > 1 and nharms * abs(freq) >= sr / 2.:
+        nharms //= 2
+        index += 1
+    return index
+
+def cacheStats():
+    """Return a dictionary with the number of cached 'tables' currently in use,
+    and their total number of 'samples'."""
+    tables = list(_cache.values())
+    return {"tables": len(tables), "samples": sum(t.getSize() for t in tables)}
+
+def benchmark(n=1000):
+    """Compare construction time and memory of 'n' two-input trigger gates and
+    'n' Pulse generators, built with fresh tables and with cached tables."""
+    import resource
+    import time
+    import pwm
+    import tablecache # the module used by pwm and triggers, not __main__
+    import triggers
+    s = Server(audio="manual").boot()
+    points = [(0,1), (8192,1)]
+    for name, table in (("fresh", lambda: LinTable(points)), ("cached", lambda: tablecache.cachedTable(LinTable, points))):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t = time.time()
+        objs = [table() for i in range(4*n)] # TrigAnd used two tables, Pulse an envelope and a waveform
+        elapsed = time.time() - t
+        print("%s: %d tables(%d distinct) in %.3fs, max RSS +%dkB"%(
+            name, len(objs), len(set(map(id, objs))), elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss))
+        del objs
+    trig = Trig()
+    t = time.time()
+    objs = [triggers.TrigAnd(trig, trig, windowlen=.01) for i in range(n)] + [pwm.Pulse(type=i % 5) for i in range(n)]
+    print("%d TrigAnd + %d Pulse in %.3fs, cache: %s"%(n, n, time.time() - t, tablecache.cacheStats()))
+    s.shutdown()
+
+if __name__ == '__main__':
+    benchmark()
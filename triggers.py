@@ -1,5 +1,8 @@
+from __future__ import print_function
+
 from pyo import *
 from itertools import *
+from tablecache import *
 
 def wrap_around(iterable, length):
     iterable = tuple(iterable)
@@ -13,14 +16,21 @@ class TrigMap(PyoObject):
     Map each input trigger to a corresponding value(with wrap around).    
     When a trigger is received, the corresponding value is outputted.
 
+    Runs entirely at audio rate, without Python callbacks: each trigger is
+    weighted by its position in its group, the position of the last received trigger
+    is held by a TrigVal and selects the value among the group's values with a Selector.
+    When triggers of a group are received at the same sample, the last one in the group wins.
+
     :Parent: :py:class:`PyoObject`
 
     :Args:
 
-        inputs : list of PyoObject
-            Audio signals sending triggers.
+        inputs : PyoObject, tuple or list
+            Audio signals sending triggers. A tuple of PyoObjects is a group of triggers
+            for one output channel, a list gives one group per channel.
         values : float or PyoObject, optional
-            Corresponding values for each trigger in `inputs`. Defaults to 0.
+            Corresponding values for each trigger in `inputs`, as a tuple for a group.
+            PyoObject values are followed until the next trigger. Defaults to 0.
         init : float, optional
             Initial value. Defaults to 0.
 
@@ -29,48 +39,130 @@ class TrigMap(PyoObject):
         The out() method is bypassed. TrigVal's signal can not be sent
         to audio outs.
 
+        Changing the number of groups changes the number of output streams.
+        Objects already reading the TrigMap keep the streams they were given.
+
+    .. seealso::
+
+        :py:class:`TrigMapFunc`, the same mapping done with a TrigFunc callback per group.
+
     """
     def __init__(self, inputs, values=0., init=0., mul=1, add=0):
         PyoObject.__init__(self, mul, add)
         self._inputs = inputs
         self._values = values
-        inputs, values, init, lmax = convertArgsToLists(inputs, values, init)
-        for i in range(max([len (inputs), len (values)])):
-            if len(wrap(values, i)) > len(wrap(inputs, i)):
-                print "Warning: length of values tuple(" + str(wrap(values, i)) + ") greater than length of associated input triggers tuple."
-
-        self._val = Sig(list(wrap_around(init, len(inputs))), mul=mul, add=add)
-        self._trigfuncs = [TrigFunc(list(wrap(inputs, i)),
-                                    function=lambda x: wrap(self._val, i).setValue(x),
-                                    arg=list(wrap(values, i)))
-                           for i in range(lmax)
-        ]
-                           
-        self._base_objs = self._val.getBaseObjects()
+        self._init = init
+        self._groups = []
+        self._outputs = [] # one Sig per group
+        self._setOutputs(self._build())
+
+    def _build(self):
+        """(Re)build every group, each keeping the position of its last trigger
+        if there was a previous group for the same channel. Returns the groups outputs."""
+        inputs, values, init, lmax = convertArgsToLists(self._inputs, self._values, self._init)
+        positions = [int(group["position"].get()) for group in self._groups]
+        self._groups = [self._buildGroup(wrap(inputs, i), wrap(values, i), wrap(init, i),
+                                         positions[i] if i < len(positions) else None)
+                        for i in range(lmax)]
+        return [group["out"] for group in self._groups]
+
+    def _setOutputs(self, outs):
+        """Connect one output stream to each of 'outs', adding or removing streams if their number changed."""
+        for sig in self._outputs[len(outs):]:
+            sig.stop()
+        del self._outputs[len(outs):]
+        for i, out in enumerate(outs):
+            if i < len(self._outputs):
+                self._outputs[i].value = out
+            else:
+                self._outputs.append(Sig(out))
+        self._base_objs = sum([sig.getBaseObjects() for sig in self._outputs], [])
+        self.setMul(self._mul)
+        self.setAdd(self._add)
+
+    def _rebuild(self):
+        """Rebuild every group and its output stream, keeping the playing state."""
+        playing = self.isPlaying()
+        self._setOutputs(self._build())
+        if not playing:
+            self.stop()
+
+    def _voices(self, ntriggers, values, init):
+        """Return the Selector inputs of a group, and those of them which were created here."""
+        values = list(values) if isinstance(values, (list, tuple)) else [values]
+        if len(values) > ntriggers:
+            print("Warning: length of values tuple(" + str(values) + ") greater than length of associated input triggers tuple.")
+        voices = [v if isinstance(v, PyoObject) else Sig(v) for v in wrap_around(values, ntriggers)]
+        voices.append(Sig(init))
+        return voices, [v for v in voices if not any(v is x for x in values)] # PyoObject overloads ==, compare identities
+
+    def _triggers(self, triggers):
+        """Build the trigger part of a group: the triggers(mixed down if multichannel),
+        their weighted maximum(position of the last received trigger) and any-trigger signal."""
+        triggers = list(triggers) if isinstance(triggers, (list, tuple)) else [triggers]
+        group = {"weighted": [], "own": []}
+        group["triggers"] = [t if len(t) == 1 else self._any(t, group["own"]) for t in triggers]
+        triggers = group["triggers"]
+        weighted = 0
+        for j in range(1, len(triggers)):
+            group["weighted"].append(Sig(triggers[j], mul=j))
+            if j > 1:
+                group["weighted"].append(Max(weighted, comp=group["weighted"][-1]))
+            weighted = group["weighted"][-1]
+        group["any"] = triggers[0] if len(triggers) == 1 else self._any(triggers, group["own"])
+        group["own"].extend(group["weighted"])
+        return group, weighted
+
+    def _any(self, triggers, own):
+        """Return a trigger signal of any of 'triggers'(one stream), adding the objects made to 'own'."""
+        mix = Mix(triggers, voices=1)
+        clip = Clip(mix, min=0, max=1)
+        own.extend([mix, clip])
+        return clip
+
+    def _buildGroup(self, triggers, values, init, position=None):
+        """Build the objects mapping one group of triggers to its values.
+        'position' is the index of the initially selected value(None for `init`)."""
+        group, weighted = self._triggers(triggers)
+        ntriggers = len(group["triggers"])
+        if position is None or position > ntriggers:
+            position = ntriggers
+        group["voices"], group["sigs"] = self._voices(ntriggers, values, init)
+        group["position"] = TrigVal(group["any"], value=weighted, init=position)
+        group["out"] = Selector(group["voices"], voice=group["position"])
+        return group
+
+    def _internals(self):
+        """Iterate on the objects created by this TrigMap(not the triggers and values given to it)."""
+        for group in self._groups:
+            for obj in group["own"] + group["sigs"] + [group["position"], group["out"]]:
+                yield obj
 
     def setInputs(self, x):
         """
-        Replace the `input` attribute.
+        Replace the `inputs` attribute.
+
+        When the number of groups and of triggers per group is unchanged,
+        the new triggers are connected to the existing objects, so the output
+        keeps its value. Otherwise all the groups are rebuilt.
 
         :Args:
 
-            x : PyoObject
-                New signal to process.
-            fadetime : float, optional
-                Crossfade time between old and new input. Defaults to 0.05.
+            x : PyoObject, tuple or list
+                New trigger signals.
 
         """
         self._inputs = x
-        self._val.value = self._val.value + list(wrap_around)
-        inputs, values, init, lmax = convertArgsToLists(x, self._values, init)
-        self._val.value = self._val.value + list(wrap_around(init, len(inputs) - len(self._val)))
-        for i in range(len(inputs)):
-            if i < len(self._trigfuncs):
-                self._trigfuncs[i].setInput(list(inputs[i]))
-            else:
-                self._trigfuncs.append(TrigFunc(list(wrap(inputs, i)),
-                                                function=lambda x: wrap(self._val, i).setValue(x),
-                                                arg=list(wrap(values, i))))
+        inputs, lmax = convertArgsToLists(x)
+        sizes = [len(wrap(inputs, i)) if isinstance(wrap(inputs, i), (list, tuple)) else 1 for i in range(lmax)]
+        if sizes != [len(group["triggers"]) for group in self._groups]:
+            self._rebuild()
+        else:
+            for i, group in enumerate(self._groups):
+                triggers, weighted = self._triggers(wrap(inputs, i))
+                group.update(triggers)
+                group["position"].setInput(group["any"], 0)
+                group["position"].setValue(weighted)
 
     def setValues(self, x):
         """
@@ -82,18 +174,24 @@ class TrigMap(PyoObject):
                 new `value` attribute.
 
         """
-        
         self._values = x
-        values, inputs, lmax = convertArgsToLists(x, self._inputs)
-        for i in range(len(values)):
-            if len(wrap(values, i)) > len(wrap(inputs, i)):
-                print "Warning: length of values tuple greater than length of input triggers tuple."
-            if i < len(self._trigfuncs):
-                self._trigfuncs[i].setArg(list(values[i]))
-            else:
-                self._trigfuncs.append(TrigFunc(list(wrap(inputs, i)),
-                                                function=lambda x: wrap(self._val, i).setValue(x),
-                                                arg=list(wrap(values, i))))
+        values, init, lmax = convertArgsToLists(x, self._init)
+        if lmax > len(self._groups):
+            self._rebuild()
+        else:
+            for i, group in enumerate(self._groups):
+                group["voices"], group["sigs"] = self._voices(len(group["triggers"]), wrap(values, i), wrap(init, i))
+                group["out"].setInputs(group["voices"])
+
+    def play(self, dur=0, delay=0):
+        for obj in self._internals():
+            obj.play(dur, delay)
+        return PyoObject.play(self, dur, delay)
+
+    def stop(self):
+        for obj in self._internals():
+            obj.stop()
+        return PyoObject.stop(self)
 
     def out(self, chnl=0, inc=1, dur=0, delay=0):
         return self.play(dur, delay)
@@ -117,72 +215,166 @@ class TrigMap(PyoObject):
     def values(self, x):
         self.setValues(x)
 
-class TrigAnd(PyoObject):
-    def __init__(self, trig1, trig2, windowlen=0, mul=1, add=0):
-        pyoArgsAssert(self, "ooOOO", trig1, trig2, windowlen, mul, add)
+class TrigMapFunc(PyoObject):
+    """
+    Same as TrigMap, with one TrigFunc callback per group setting the output value.
+    Values take effect at the next audio block. Kept for comparison, see `benchmark`.
+
+    :Parent: :py:class:`PyoObject`
+
+    :Args:
+
+        inputs : PyoObject, tuple or list
+            Audio signals sending triggers.
+        values : float or PyoObject, optional
+            Corresponding values for each trigger in `inputs`. Defaults to 0.
+        init : float, optional
+            Initial value. Defaults to 0.
+
+    """
+    def __init__(self, inputs, values=0., init=0., mul=1, add=0):
         PyoObject.__init__(self, mul, add)
-        self._trig1 = trig1
-        self._trig2 = trig2
-        self._in_fader1 = InputFader(trig1)
-        self._in_fader2 = InputFader(trig2)
+        self._inputs = inputs
+        self._values = values
+        inputs, values, init, lmax = convertArgsToLists(inputs, values, init)
+        self._val = Sig(list(wrap_around(init, lmax)), mul=mul, add=add)
+        self._trigfuncs = [self._trigFunc(wrap(inputs, i), wrap(values, i), i) for i in range(lmax)]
+        self._base_objs = self._val.getBaseObjects()
+
+    def _trigFunc(self, triggers, values, i):
+        triggers = list(triggers) if isinstance(triggers, (list, tuple)) else [triggers]
+        values = list(values) if isinstance(values, (list, tuple)) else [values]
+        return TrigFunc(triggers, function=lambda x, i=i: wrap(self._val, i).setValue(x),
+                        arg=list(wrap_around(values, len(triggers))))
+
+    def out(self, chnl=0, inc=1, dur=0, delay=0):
+        return self.play(dur, delay)
+
+class TrigLogic(PyoObject):
+    """
+    Trigger logic over any number of inputs.
+
+    Each input trigger opens a hold window of `windowlen` seconds, the open windows are
+    counted at audio rate, and a trigger is sent on the exact sample where the count
+    starts satisfying `expr`. Holding windows use one TrigEnv per input, summed stream by stream:
+    output channel k counts the windows of stream k of each input(inputs with less streams
+    wrap around), so multichannel inputs give one logic per channel.
+
+    :Parent: :py:class:`PyoObject`
+
+    :Args:
+
+        inputs : list of PyoObject
+            Trigger signals.
+        expr : string or int, optional
+            Condition on the number of open windows:
+                "and": all the inputs,
+                "or": at least one input,
+                "xor": exactly one input,
+                k(int): at least k inputs.
+            Defaults to "and".
+        windowlen : float or PyoObject, optional
+            Length, in seconds, of the window opened by each trigger. Defaults to 0.
+
+    """
+    def __init__(self, inputs, expr="and", windowlen=0, mul=1, add=0):
+        pyoArgsAssert(self, "lOOO", inputs, windowlen, mul, add)
+        PyoObject.__init__(self, mul, add)
+        self._inputs = inputs
+        self._expr = expr
         self._windowlen = windowlen
-        trig1, trig2, windowlen, lmax = convertArgsToLists(trig1, trig2, windowlen)
-        self._hold1 = TrigEnv(self._in_fader1, LinTable([(0,1), (8192,1)]), dur=windowlen)
-        self._hold2 = TrigEnv(self._in_fader2, LinTable([(0,1), (8192,1)]), dur=windowlen)
-        self._out = Thresh(self._hold1+self._hold2, threshold=1, dir=0)
+        self._table = cachedTable(LinTable, [(0,1), (8192,1)])
+        self._holds = [TrigEnv(input, self._table, dur=windowlen) for input in inputs]
+        self._count = self._sum(self._holds)
+        mode, comp = self._condition(expr, len(inputs))
+        self._cond = Compare(self._count, comp=comp, mode=mode)
+        self._out = Thresh(self._cond, threshold=0.5, dir=0, mul=mul, add=add)
         self._base_objs = self._out.getBaseObjects()
 
-    def setTrig1(self, x, fadetime=0.05):
+    def _sum(self, holds):
+        """Return the count of open windows, stream k summing stream k of each input's holds."""
+        return sum(holds[1:], holds[0])
+
+    def _condition(self, expr, ninputs):
+        """Return the (mode, comp) arguments of the Compare testing the count of open windows."""
+        if expr == "and":
+            return (">=", ninputs)
+        elif expr == "or":
+            return (">=", 1)
+        elif expr == "xor":
+            return ("==", 1)
+        elif isinstance(expr, int) and not isinstance(expr, bool):
+            return (">=", expr)
+        else:
+            raise Exception("Invalid trigger logic expression '%s'"%(expr,))
+
+    def setInputs(self, x, fadetime=0.05):
         """
-        Replace the `trig1` attribute.
+        Replace the `inputs` attribute.
 
         :Args:
 
-            x: PyoObject
-                New signal to process.
+            x: list of PyoObject
+                New trigger signals.
             fadetime: float, optional
-                Crossfade time between old and new input. Default to 0.05.
+                Crossfade time between old and new inputs. Default to 0.05.
 
         """
-        pyoArgsAssert(self, "oN", x, fadetime)
-        self._trig1 = x
-        self._in_fader1.setInput(x, fadetime)
-
-
-    def setTrig2(self, x, fadetime=0.05):
+        pyoArgsAssert(self, "lN", x, fadetime)
+        mode, comp = self._condition(self._expr, len(x))
+        self._inputs = x
+        if len(x) == len(self._holds):
+            for hold, input in zip(self._holds, x):
+                hold.setInput(input, fadetime)
+        else:
+            self._holds = [TrigEnv(input, self._table, dur=self._windowlen) for input in x]
+            self._count = self._sum(self._holds)
+            self._cond.setInput(self._count, fadetime)
+        self._cond.comp = comp
+
+    def setExpr(self, x):
         """
-        Replace the `trig2` attribute.
+        Replace the `expr` attribute.
 
         :Args:
 
-            x: PyoObject
-                New signal to process.
-            fadetime: float, optional
-                Crossfade time between old and new input. Default to 0.05.
+            x: string or int
+                New condition, "and", "or", "xor" or a number of inputs.
 
         """
-        pyoArgsAssert(self, "oN", x, fadetime)
-        self._trig2 = x
-        self._in_fader2.setInput(x, fadetime)
+        mode, comp = self._condition(x, len(self._inputs))
+        self._expr = x
+        self._cond.mode = mode
+        self._cond.comp = comp
 
     def setWindowlen(self, x):
+        """
+        Replace the `windowlen` attribute.
+
+        :Args:
+
+            x: float or PyoObject
+                New window length, in seconds.
+
+        """
         self._windowlen = x
-        self._timer.time = x
+        for hold in self._holds:
+            hold.dur = x
 
     @property
-    def trig1(self):
-        """PyoObject. Timer stop signal."""
-        return self._trig1
-    @trig1.setter
-    def trig1(self, x): self.setTrig1(x)
+    def inputs(self):
+        """list of PyoObject. Trigger signals."""
+        return self._inputs
+    @inputs.setter
+    def inputs(self, x): self.setInputs(x)
 
     @property
-    def trig2(self):
-        """PyoObject. Timer start signal."""
-        return self._trig2
-    @trig2.setter
-    def trig2(self, x): self.setTrig2(x)
-    
+    def expr(self):
+        """string or int. Condition on the number of open windows."""
+        return self._expr
+    @expr.setter
+    def expr(self, x): self.setExpr(x)
+
     @property
     def windowlen(self):
         return self._windowlen
@@ -197,21 +389,13 @@ class TrigAnd(PyoObject):
 
         PyoObject.ctrl(self, map_list, title, wxnoserver)
 
+class _TrigLogic2(TrigLogic):
+    """Two-input TrigLogic, with `trig1` and `trig2` attributes."""
+    _EXPR = "and"
 
-class TrigOr(PyoObject):
     def __init__(self, trig1, trig2, windowlen=0, mul=1, add=0):
         pyoArgsAssert(self, "ooOOO", trig1, trig2, windowlen, mul, add)
-        PyoObject.__init__(self, mul, add)
-        self._trig1 = trig1
-        self._trig2 = trig2
-        self._in_fader1 = InputFader(trig1)
-        self._in_fader2 = InputFader(trig2)
-        self._windowlen = windowlen
-        trig1, trig2, windowlen, lmax = convertArgsToLists(trig1, trig2, windowlen)
-        self._hold1 = TrigEnv(self._in_fader1, LinTable([(0,1), (8192,1)]), dur=windowlen)
-        self._hold2 = TrigEnv(self._in_fader2, LinTable([(0,1), (8192,1)]), dur=windowlen)
-        self._out = Thresh(self._hold1+self._hold2, threshold=0, dir=0)
-        self._base_objs = self._out.getBaseObjects()
+        TrigLogic.__init__(self, [trig1, trig2], expr=self._EXPR, windowlen=windowlen, mul=mul, add=add)
 
     def setTrig1(self, x, fadetime=0.05):
         """
@@ -226,9 +410,7 @@ class TrigOr(PyoObject):
 
         """
         pyoArgsAssert(self, "oN", x, fadetime)
-        self._trig1 = x
-        self._in_fader1.setInput(x, fadetime)
-
+        self.setInputs([x, self._inputs[1]], fadetime)
 
     def setTrig2(self, x, fadetime=0.05):
         """
@@ -243,123 +425,103 @@ class TrigOr(PyoObject):
 
         """
         pyoArgsAssert(self, "oN", x, fadetime)
-        self._trig2 = x
-        self._in_fader2.setInput(x, fadetime)
-
-    def setWindowlen(self, x):
-        self._windowlen = x
-        self._timer.time = x
+        self.setInputs([self._inputs[0], x], fadetime)
 
     @property
     def trig1(self):
-        """PyoObject. Timer stop signal."""
-        return self._trig1
+        """PyoObject. First trigger signal."""
+        return self._inputs[0]
     @trig1.setter
     def trig1(self, x): self.setTrig1(x)
 
     @property
     def trig2(self):
-        """PyoObject. Timer start signal."""
-        return self._trig2
+        """PyoObject. Second trigger signal."""
+        return self._inputs[1]
     @trig2.setter
     def trig2(self, x): self.setTrig2(x)
-    
-    @property
-    def windowlen(self):
-        return self._windowlen
-    @windowlen.setter
-    def windowlen(self, x):
-        self.setWindowlen(x)
 
-    def ctrl(self, map_list=None, title=None, wxnoserver=False):
-        self._map_list = [
-            SLMap(0.0001, 10, "log", "windowlen", self._windowlen),
-        ]
+class TrigAnd(_TrigLogic2):
+    """
+    Sends a trigger when both input triggers are received in the timeframe defined by `windowlen`.
 
-        PyoObject.ctrl(self, map_list, title, wxnoserver)
+    Two-input TrigLogic with expr="and".
 
-class TrigXor(PyoObject):
-    def __init__(self, trig1, trig2, windowlen=0, mul=1, add=0):
-        pyoArgsAssert(self, "ooOOO", trig1, trig2, windowlen, mul, add)
-        PyoObject.__init__(self, mul, add)
-        self._trig1 = trig1
-        self._trig2 = trig2
-        self._in_fader1 = InputFader(trig1)
-        self._in_fader2 = InputFader(trig2)
-        self._windowlen = windowlen
-        trig1, trig2, windowlen, lmax = convertArgsToLists(trig1, trig2, windowlen)
-        self._hold1 = TrigEnv(self._in_fader1, LinTable([(0,1), (8192,1)]), dur=windowlen)
-        self._hold2 = TrigEnv(self._in_fader2, LinTable([(0,1), (8192,1)]), dur=windowlen)
-        self._out = Select(self._hold1+self._hold2, value=1)
-        self._base_objs = self._out.getBaseObjects()
+    :Parent: :py:class:`TrigLogic`
 
-    def setTrig1(self, x, fadetime=0.05):
-        """
-        Replace the `trig1` attribute.
+    :Args:
 
-        :Args:
+        trig1 : PyoObject
+            First trigger signal.
+        trig2 : PyoObject
+            Second trigger signal.
+        windowlen : float or PyoObject, optional
+            Length, in seconds, of the window opened by each trigger. Defaults to 0.
 
-            x: PyoObject
-                New signal to process.
-            fadetime: float, optional
-                Crossfade time between old and new input. Default to 0.05.
+    """
+    _EXPR = "and"
 
-        """
-        pyoArgsAssert(self, "oN", x, fadetime)
-        self._trig1 = x
-        self._in_fader1.setInput(x, fadetime)
+class TrigOr(_TrigLogic2):
+    """
+    Sends a trigger when either input trigger is received, triggers received
+    while the window of the other is open being merged.
 
+    Two-input TrigLogic with expr="or".
 
-    def setTrig2(self, x, fadetime=0.05):
-        """
-        Replace the `trig2` attribute.
+    :Parent: :py:class:`TrigLogic`
 
-        :Args:
+    :Args:
 
-            x: PyoObject
-                New signal to process.
-            fadetime: float, optional
-                Crossfade time between old and new input. Default to 0.05.
+        trig1 : PyoObject
+            First trigger signal.
+        trig2 : PyoObject
+            Second trigger signal.
+        windowlen : float or PyoObject, optional
+            Length, in seconds, of the window opened by each trigger. Defaults to 0.
 
-        """
-        pyoArgsAssert(self, "oN", x, fadetime)
-        self._trig2 = x
-        self._in_fader2.setInput(x, fadetime)
+    """
+    _EXPR = "or"
 
-    def setWindowlen(self, x):
-        self._windowlen = x
-        self._timer.time = x
+class TrigXor(_TrigLogic2):
+    """
+    Sends a trigger when only one of the input triggers is received in the timeframe defined by `windowlen`.
 
-    @property
-    def trig1(self):
-        """PyoObject. Timer stop signal."""
-        return self._trig1
-    @trig1.setter
-    def trig1(self, x): self.setTrig1(x)
+    Two-input TrigLogic with expr="xor".
 
-    @property
-    def trig2(self):
-        """PyoObject. Timer start signal."""
-        return self._trig2
-    @trig2.setter
-    def trig2(self, x): self.setTrig2(x)
-    
-    @property
-    def windowlen(self):
-        return self._windowlen
-    @windowlen.setter
-    def windowlen(self, x):
-        self.setWindowlen(x)
+    :Parent: :py:class:`TrigLogic`
 
-    def ctrl(self, map_list=None, title=None, wxnoserver=False):
-        self._map_list = [
-            SLMap(0.0001, 10, "log", "windowlen", self._windowlen),
-        ]
+    :Args:
+
+        trig1 : PyoObject
+            First trigger signal.
+        trig2 : PyoObject
+            Second trigger signal.
+        windowlen : float or PyoObject, optional
+            Length, in seconds, of the window opened by each trigger. Defaults to 0.
+
+    """
+    _EXPR = "xor"
 
-        PyoObject.ctrl(self, map_list, title, wxnoserver)
 
-        
 class TrigGate(PyoObject):
+    """
+    Pass the input signal after an `open` trigger, block it after a `close` trigger.
+
+    The gate is a TrigMap, so it opens and closes on the exact sample of the
+    triggers, whatever the server buffer size.
+
+    :Parent: :py:class:`PyoObject`
+
+    :Args:
+
+        input : PyoObject
+            Signal to pass or block.
+        open : PyoObject
+            Trigger signal opening the gate.
+        close : PyoObject
+            Trigger signal closing the gate.
+
+    """
     def __init__(self, input, open, close, mul=1, add=0):
         pyoArgsAssert(self, "oooOO", input, open, close, mul, add)
         PyoObject.__init__(self, mul, add)
@@ -369,7 +531,8 @@ class TrigGate(PyoObject):
         self._input_fader = InputFader(input)
         self._open_fader = InputFader(open)
         self._close_fader = InputFader(close)
-        self._out = Sig(self._input_fader, mul=TrigMap((self._open_fader, self._close_fader), values=(1, 0)))
+        self._gate = TrigMap((self._open_fader, self._close_fader), values=(1, 0))
+        self._out = Sig(self._input_fader, mul=self._gate)
         self._base_objs = self._out.getBaseObjects()
 
     def setInput(self, x, fadetime=0.05):
@@ -421,6 +584,16 @@ class TrigGate(PyoObject):
         self._close = x
         self._close_fader.setInput(x, fadetime)
 
+    def play(self, dur=0, delay=0):
+        for obj in (self._input_fader, self._open_fader, self._close_fader, self._gate):
+            obj.play(dur, delay)
+        return PyoObject.play(self, dur, delay)
+
+    def stop(self):
+        for obj in (self._input_fader, self._open_fader, self._close_fader, self._gate):
+            obj.stop()
+        return PyoObject.stop(self)
+
     @property
     def input(self):
         """PyoObject. input signal to pass or block."""
@@ -450,7 +623,72 @@ class TrigGate(PyoObject):
         PyoObject.ctrl(self, map_list, title, wxnoserver)
     
 
+def benchmark(nmaps=100, rate=1000, dur=10):
+    """Compare the CPU time of TrigMap and TrigMapFunc, for 'nmaps' two-trigger maps
+    each receiving 'rate' triggers per second, over 'dur' seconds of offline processing."""
+    import time
+    s = Server(audio="manual").boot()
+    s.start()
+    nblocks = int(dur * s.getSamplingRate() / s.getBufferSize())
+    for cls in (TrigMapFunc, TrigMap):
+        trigs = [Metro(time=2./rate).play(), Metro(time=2./rate).play(delay=1./rate)]
+        maps = [cls((trigs[0], trigs[1]), values=(1, 0)) for i in range(nmaps)]
+        t = time.time()
+        for i in range(nblocks):
+            s.process()
+        elapsed = time.time() - t
+        print("%s: %.2fms CPU per second of audio per 1k triggers/s"%(cls.__name__, 1000 * elapsed / dur / (nmaps * rate / 1000.)))
+        for obj in trigs + maps:
+            obj.stop()
+    s.shutdown()
+
+def check(buffersize=512):
+    """Check that triggers are handled on their exact sample, whatever the buffer size:
+    impulses at known sample positions go through TrigMap, TrigGate and TrigAnd/TrigOr/TrigXor,
+    and the samples where their outputs change must be those of the impulses.
+    Raises an exception on mismatch."""
+    sr = 44100
+    length = 6000
+    s = Server(audio="manual", sr=sr, buffersize=buffersize).boot()
+    s.start()
+    def impulses(*positions):
+        table = DataTable(length, init=[1. if i in positions else 0. for i in range(length)])
+        return TableRead(table, freq=table.getRate()).play()
+    opens, closes = impulses(100, 1500), impulses(600, 2000)
+    first, second = impulses(100, 3000, 4000), impulses(1000, 3001)
+    window = 0.001 # 44 samples
+    tests = [
+        ("TrigMap", TrigMap((first, second), values=(1, 2)), [100, 1000, 3000, 3001, 4000]),
+        ("TrigGate", TrigGate(Sig(1), opens, closes), [100, 600, 1500, 2000]),
+        ("TrigAnd", TrigAnd(first, second, windowlen=window), [3001, 3002]),
+        ("TrigOr", TrigOr(first, second, windowlen=window), [100, 101, 1000, 1001, 3000, 3001, 4000, 4001]),
+        # the first window(44.1 samples) closes while the second is open: one window again
+        ("TrigXor", TrigXor(first, second, windowlen=window), [100, 101, 1000, 1001, 3000, 3001, 3045, 3046, 4000, 4001]),
+    ]
+    # recorders are created last, objects being processed in creation order
+    tables = [NewTable(length / float(sr)) for test in tests]
+    recorders = [TableRec(obj, table).play() for (name, obj, edges), table in zip(tests, tables)]
+    for i in range(length // buffersize + 2):
+        s.process()
+    failed = []
+    for (name, obj, expected), table in zip(tests, tables):
+        samples = table.getTable()
+        edges = [i for i in range(length) if samples[i] != (samples[i - 1] if i > 0 else 0)]
+        print("%s: edges at %s"%(name, edges))
+        if edges != expected:
+            failed.append("%s: expected edges at %s, got %s"%(name, expected, edges))
+    s.shutdown()
+    if failed:
+        raise Exception("Trigger timing mismatch at buffer size %d:\n%s"%(buffersize, "\n".join(failed)))
+
 if __name__ == '__main__':
+    import sys
+    if "--bench" in sys.argv:
+        benchmark()
+        sys.exit()
+    if "--check" in sys.argv:
+        check()
+        sys.exit()
     # Running as a script
     s = Server().boot()
     a = Sine()